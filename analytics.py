@@ -0,0 +1,95 @@
+import threading
+from datetime import date
+
+import pandas as pd
+
+from events import data_version
+from slots import TIME_SLOTS
+from storage import ensure_fresh, get_all_reports, get_appointments, get_pharmacist_schedule
+
+STATUSES = ["Pending Confirmation", "Confirmed", "Rescheduled", "Cancelled", "Completed"]
+OPEN_STATUSES = ["Pending Confirmation", "Confirmed", "Rescheduled"]
+
+# Results are shared by all sessions and recomputed only when the data
+# version (or the day, which no-shows depend on) changes.
+_memo = {"key": None, "result": None}
+_lock = threading.Lock()
+
+
+def load_frames():
+    appointments = pd.DataFrame(get_appointments(), columns=["appointmentID", "customerID", "Date", "Time", "Status"])
+    appointments["customerID"] = appointments["customerID"].astype(str)
+    appointments["appointmentID"] = appointments["appointmentID"].astype(str)
+    appointments["Date"] = pd.to_datetime(appointments["Date"], errors="coerce")
+    appointments["Status"] = pd.Categorical(appointments["Status"], categories=STATUSES)
+    appointments["Time"] = pd.Categorical(appointments["Time"], categories=TIME_SLOTS, ordered=True)
+
+    reports = pd.DataFrame(get_all_reports(), columns=["reportID", "appointmentID", "reportDate"])
+    reports["appointmentID"] = reports["appointmentID"].astype(str)
+    reports["reportDate"] = pd.to_datetime(reports["reportDate"], errors="coerce")
+
+    schedules = pd.DataFrame(get_pharmacist_schedule(), columns=["Date", "Time"])
+    schedules["Date"] = pd.to_datetime(schedules["Date"], errors="coerce")
+    schedules["Time"] = pd.Categorical(schedules["Time"], categories=TIME_SLOTS, ordered=True)
+    return appointments, reports, schedules
+
+def _utilization(booked, open_slots, by):
+    # Booked slots are removed from Schedules, so capacity = booked + still open.
+    counts = pd.concat([
+        booked.groupby(by, observed=True).size().rename("Booked"),
+        open_slots.groupby(by, observed=True).size().rename("Open"),
+    ], axis=1).fillna(0).astype(int)
+    counts["Utilization"] = counts["Booked"] / (counts["Booked"] + counts["Open"])
+    return counts.sort_index()
+
+def compute(appointments, reports, schedules, today):
+    today = pd.Timestamp(today)
+    live = appointments[appointments["Status"] != "Cancelled"]
+
+    total = len(appointments)
+    cancellation_rate = (appointments["Status"] == "Cancelled").sum() / total if total else 0.0
+
+    # No status records a no-show, so count past appointments that were
+    # never completed (or cancelled) as missed.
+    past = appointments[(appointments["Date"] < today) & appointments["Status"].isin(OPEN_STATUSES + ["Completed"])]
+    no_show_rate = past["Status"].isin(OPEN_STATUSES).sum() / len(past) if len(past) else 0.0
+
+    # Bookings carry no creation timestamp, so lead time is measured from the
+    # appointment to its report being written.
+    joined = reports.merge(appointments[["appointmentID", "Date"]], on="appointmentID", how="inner")
+    lead_days = (joined["reportDate"] - joined["Date"]).dt.days.dropna()
+
+    flags = appointments.assign(
+        Completed=appointments["Status"] == "Completed",
+        Cancelled=appointments["Status"] == "Cancelled",
+    )
+    visits = flags.groupby("customerID").agg(
+        Bookings=("appointmentID", "size"),
+        Completed=("Completed", "sum"),
+        Cancelled=("Cancelled", "sum"),
+        LastVisit=("Date", "max"),
+    ).sort_values("Bookings", ascending=False)
+
+    return {
+        "total_appointments": total,
+        "cancellation_rate": float(cancellation_rate),
+        "no_show_rate": float(no_show_rate),
+        "lead_time_mean": float(lead_days.mean()) if len(lead_days) else None,
+        "lead_time_median": float(lead_days.median()) if len(lead_days) else None,
+        "status_counts": appointments["Status"].value_counts().reindex(STATUSES, fill_value=0),
+        "utilization_by_day": _utilization(live, schedules, "Date"),
+        "utilization_by_slot": _utilization(live, schedules, "Time"),
+        "customer_visits": visits,
+    }
+
+def get_analytics(today=None):
+    ensure_fresh("Appointments", "Reports", "Schedules")
+    today = today or date.today()
+    key = (data_version(), today)
+    with _lock:
+        if _memo["key"] == key:
+            return _memo["result"]
+    result = compute(*load_frames(), today)
+    with _lock:
+        _memo["key"], _memo["result"] = key, result
+    return result
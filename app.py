@@ -1,13 +1,26 @@
 import streamlit as st
-from auth import register_user, login_user, check_email_exists, check_password_complexity, get_customer_id
-from google_sheets import (
-    save_customer, upload_to_drive, save_appointment,
+from passwords import check_password_complexity
+from storage import (
+    register_user, login_user, check_email_exists, get_customer_id,
+    save_customer, save_appointment, save_file_metadata, find_file,
     get_appointments, get_pharmacist_schedule,
-    update_schedule, update_appointment_status,
-    get_all_customers,  save_report, get_all_reports
+    update_appointment_status, update_appointments,
+    get_all_customers,  save_report, remove_schedule_slot,
+    add_schedule_slots, remove_schedule_slots,
+    archive_appointments, get_archived_appointments
 )
+from archive import ARCHIVE_AFTER_DAYS
+from availability import available_dates, free_slots
+from customer_appointments import customer_appointments
+from report_store import filter_options, search_reports
+from slots import TIME_SLOTS, parse_date, time_sort_key
+from pagination import count_pages, paginate
+from drive_uploads import referral_location, store_referral, submit_upload
+from instrumentation import start_rerun
+from request_context import begin as begin_request
 import os
 import pandas as pd
+from datetime import date, timedelta
 from collections import defaultdict
 
 st.set_page_config(page_title="Farmasi Pantai Hillpark", layout="wide")
@@ -32,9 +45,14 @@ if st.session_state.logged_in:
     if st.session_state.user_role == 'Customer':
         menu = ["Book Appointment", "My Appointments", "Logout"]
     elif st.session_state.user_role == 'Pharmacist':
-        menu = ["Manage Appointments", "Add Slot Availability","Available Slots", "Add Report", "Logout"]
+        menu = ["Manage Appointments", "Add Slot Availability","Available Slots", "Add Report", "Analytics", "Logout"]
+        # Hidden admin page, reached with ?admin=1
+        if st.query_params.get("admin") == "1":
+            menu.insert(-1, "API Stats")
 
 choice = st.sidebar.selectbox("Menu", menu)
+start_rerun(choice)
+begin_request()
 
 # --------------------------------------------
 # Register
@@ -82,53 +100,52 @@ elif choice == "Login":
 # Book Appointment
 elif choice == "Book Appointment":
     st.subheader("Book an Appointment")
-    available_schedule = get_pharmacist_schedule()
-    if not available_schedule:
+    open_dates = available_dates()
+    if not open_dates:
         st.warning("No available slots. Please try again later.")
     else:
-        available_dates = sorted(set(slot["Date"] for slot in available_schedule))
-        selected_date = st.selectbox("Select Date", available_dates)
-        available_times = [slot["Time"] for slot in available_schedule if slot["Date"] == selected_date]
-        selected_time = st.selectbox("Select Time Slot", available_times)
+        selected_date = st.selectbox("Select Date", open_dates)
+        selected_time = st.selectbox("Select Time Slot", free_slots(selected_date))
         uploaded_file = st.file_uploader("Upload Referral Letter")
 
         if st.button("Book Appointment"):
             if not uploaded_file:
                 st.error("Please upload a referral letter.")
             else:
-                if not os.path.exists("uploads"):
-                    os.makedirs("uploads")
-
-                # Save the uploaded file locally
-                file_path = f"uploads/{uploaded_file.name}"
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+                # The file is kept locally under its content hash, but only once the booking has gone through
+                file_path, digest = referral_location(uploaded_file.getbuffer(), uploaded_file.name)
 
                 # Save appointment with referral path
-                save_appointment([
+                appointment_id = save_appointment([
                     st.session_state.customer_id,
                     selected_date,
                     selected_time,
                     "Pending Confirmation"
                 ], referral_path=file_path)
 
-                st.success(f"Appointment booked on {selected_date} at {selected_time}.")
+                if appointment_id is None:
+                    st.error("Sorry, that slot was just booked by someone else. Please choose another.")
+                else:
+                    # Keep the file locally; it is copied to Drive in the background
+                    store_referral(uploaded_file.getbuffer(), uploaded_file.name)
+                    submit_upload(
+                        file_path, digest, name=uploaded_file.name,
+                        on_complete=lambda file_id, name=uploaded_file.name, path=file_path: save_file_metadata([name, path, file_id]),
+                        existing=lambda path=file_path: find_file(path),
+                    )
+                    st.success(f"Appointment booked on {selected_date} at {selected_time}.")
 # --------------------------------------------
 # My Appointments
 elif choice == "My Appointments":
     st.subheader("📋 My Appointments")
 
-    appointments = get_appointments()
-    my_appointments = [
-        appt for appt in appointments
-        if str(appt.get('customerID')) == str(st.session_state.customer_id)
-    ]
+    my_appointments = customer_appointments(st.session_state.customer_id)
+    active_appts = my_appointments["active"]
+    past_appts = my_appointments["past"]
 
-    if not my_appointments:
+    if not active_appts and not past_appts:
         st.info("No appointments found.")
     else:
-        active_appts = [appt for appt in my_appointments if appt['Status'] in ["Pending Confirmation", "Confirmed", "Rescheduled"]]
-        past_appts = [appt for appt in my_appointments if appt['Status'] in ["Cancelled", "Completed"]]
 
         # --------------------
         # Section 1: Active
@@ -143,27 +160,21 @@ elif choice == "My Appointments":
             if cols[3].button("Reschedule", key=f"reschedule_{idx}"):
                 with st.form(f"reschedule_form_{idx}"):
                     st.subheader(f"Reschedule Slot for {appt['Date']} {appt['Time']}")
-                    schedule = get_pharmacist_schedule()
-                    booked = [(a['Date'], a['Time']) for a in get_appointments()]
-                    available_slots = [
-                        s for s in schedule if (s['Date'], s['Time']) not in booked
-                    ]
-
-                    dates = sorted(list(set([s['Date'] for s in available_slots])))
-                    new_date = st.selectbox("New Date", dates)
-                    new_times = [s['Time'] for s in available_slots if s['Date'] == new_date]
-                    new_time = st.selectbox("New Time", new_times)
+                    new_date = st.selectbox("New Date", available_dates())
+                    new_time = st.selectbox("New Time", free_slots(new_date))
 
                     submitted = st.form_submit_button("Confirm Reschedule")
                     if submitted:
-                        update_appointment_status(
+                        if update_appointment_status(
                             appointment_id=appt["appointmentID"],
                             new_status="Rescheduled",
                             new_date=new_date,
                             new_time=new_time
-                        )
-                        st.success("Rescheduled successfully!")
-                        st.rerun()
+                        ):
+                            st.success("Rescheduled successfully!")
+                            st.rerun()
+                        else:
+                            st.error("That slot was just booked. Please pick another time.")
 
             # CANCEL BUTTON
             if cols[4].button("❌ Cancel", key=f"cancel_{idx}"):
@@ -191,11 +202,30 @@ elif choice == "My Appointments":
                 row[1].write(f"{appt['Time']}")
                 row[2].write(f"{appt['Status']}")
 
+    # Older history lives in the monthly archives; only read it on request
+    if st.checkbox("🗄️ Show archived appointments"):
+        archived = get_archived_appointments(customer_id=st.session_state.customer_id)
+        if not archived:
+            st.info("No archived appointments.")
+        for appt in sorted(archived, key=lambda a: (parse_date(a["Date"]) or date.min, time_sort_key(a["Time"])), reverse=True):
+            row = st.columns([2, 2, 2])
+            row[0].write(f"{appt['Date']}")
+            row[1].write(f"{appt['Time']}")
+            row[2].write(f"{appt['Status']}")
+
 # --------------------------------------------
 # Manage Appointment
 elif choice == "Manage Appointments":
     st.subheader("🗂️ Manage Appointments")
 
+    with st.expander("🗄️ Archive old appointments"):
+        st.caption("Moves completed and cancelled appointments, with their reports, into monthly archive sheets.")
+        archive_days = st.number_input("Older than (days)", min_value=0, value=ARCHIVE_AFTER_DAYS, step=1)
+        if st.button("Archive now"):
+            moved = archive_appointments(older_than_days=int(archive_days))
+            st.success(f"✅ {moved} appointments archived.")
+            st.rerun()
+
     appointments = get_appointments()
     customers = {str(c["customerID"]): c for c in get_all_customers()}
 
@@ -208,6 +238,16 @@ elif choice == "Manage Appointments":
 
         selected_customer = st.selectbox("🔎 Filter by Customer ID", ["All"] + customer_ids)
         selected_status = st.selectbox("📌 Filter by Status", statuses)
+        date_range = st.date_input("📅 Filter by Date Range", value=())
+
+        sort_options = {
+            "Date (newest first)": (lambda a: (parse_date(a["Date"]) or date.min, time_sort_key(a["Time"])), True),
+            "Date (oldest first)": (lambda a: (parse_date(a["Date"]) or date.max, time_sort_key(a["Time"])), False),
+            "Appointment ID": (lambda a: int(a["appointmentID"]) if str(a["appointmentID"]).isdigit() else 0, False),
+        }
+        sort_cols = st.columns(2)
+        selected_sort = sort_cols[0].selectbox("↕️ Sort by", list(sort_options))
+        page_size = sort_cols[1].selectbox("Rows per page", [10, 25, 50, 100])
 
         # Apply filters
         filtered_appointments = appointments
@@ -215,10 +255,22 @@ elif choice == "Manage Appointments":
             filtered_appointments = [a for a in filtered_appointments if str(a["customerID"]) == selected_customer]
         if selected_status != "All":
             filtered_appointments = [a for a in filtered_appointments if a["Status"] == selected_status]
-
-        st.markdown(f"### Showing {len(filtered_appointments)} appointments")
-
-        for idx, appt in enumerate(filtered_appointments):
+        if len(date_range) == 2:
+            filtered_appointments = [
+                a for a in filtered_appointments
+                if parse_date(a["Date"]) and date_range[0] <= parse_date(a["Date"]) <= date_range[1]
+            ]
+        sort_key, descending = sort_options[selected_sort]
+        filtered_appointments = sorted(filtered_appointments, key=sort_key, reverse=descending)
+
+        page = st.number_input("Page", min_value=1, max_value=count_pages(len(filtered_appointments), page_size), value=1, step=1)
+        page_appointments, page, page_count = paginate(filtered_appointments, page, page_size)
+
+        st.markdown(f"### Showing {len(page_appointments)} of {len(filtered_appointments)} appointments (page {page} of {page_count})")
+        pending_updates = []
+
+        for appt in page_appointments:
+            idx = appt["appointmentID"]
             cust = customers.get(str(appt["customerID"]), {})
             full_name = cust.get("Full Name", "Unknown")
             email = cust.get("Email", "N/A")
@@ -237,18 +289,24 @@ elif choice == "Manage Appointments":
             cols[4].write(f"📅 {appt['Date']}")
             cols[5].write(f"🕒 {appt['Time']}")
 
-            # 📄 Referral Letter
-            if referral_path and os.path.exists(referral_path):
-                with open(referral_path, "rb") as f:
-                    cols[6].download_button(
-                        label="📄 Download",
-                        data=f,
-                        file_name=os.path.basename(referral_path),
-                        mime="application/octet-stream",
-                        key=f"download_{idx}"
-                    )
-            else:
+            # 📄 Referral Letter (read from disk only once the pharmacist asks for it)
+            if not referral_path:
                 cols[6].write("—")
+            elif st.session_state.get(f"referral_loaded_{idx}"):
+                if os.path.exists(referral_path):
+                    with open(referral_path, "rb") as f:
+                        cols[6].download_button(
+                            label="📄 Download",
+                            data=f.read(),
+                            file_name=os.path.basename(referral_path),
+                            mime="application/octet-stream",
+                            key=f"download_{idx}"
+                        )
+                else:
+                    cols[6].write("File missing")
+            elif cols[6].button("📄 Load Referral", key=f"load_referral_{idx}"):
+                st.session_state[f"referral_loaded_{idx}"] = True
+                st.rerun()
 
             # ✅ Update status
             new_status = cols[7].selectbox(
@@ -258,6 +316,9 @@ elif choice == "Manage Appointments":
                 key=f"status_{idx}"
             )
 
+            if new_status != appt["Status"]:
+                pending_updates.append({"appointment_id": appt["appointmentID"], "new_status": new_status})
+
             if st.button("Update", key=f"update_{idx}"):
                 update_appointment_status(appt["appointmentID"], new_status)
                 st.success(f"✅ Appointment {appt['appointmentID']} updated.")
@@ -265,20 +326,46 @@ elif choice == "Manage Appointments":
 
             st.markdown("</div>", unsafe_allow_html=True)
 
+        # 💾 Commit every changed status in one request
+        if st.button(f"💾 Save All Changes ({len(pending_updates)})", disabled=not pending_updates):
+            updated = update_appointments(pending_updates)
+            st.success(f"✅ {updated} appointments updated.")
+            st.rerun()
+
 
 # --------------------------------------------
 # Update Slot Availability
 elif choice == "Add Slot Availability":
     st.subheader("➕ Add New Slot")
-    slot_date = st.date_input("Available Date")
-    slot_time = st.selectbox("Available Time", ["8:00AM-9:00AM","9:00AM-10:00AM", "10:00AM-11:00AM", "11:00AM-12:00PM","2:00PM-3:00PM", "3:00PM-4:00PM", "4:00PM-5:00PM"])
-    schedule = get_pharmacist_schedule()
-    if st.button("Add Slot"):
-        if any(s["Date"] == str(slot_date) and s["Time"] == slot_time for s in schedule):
-            st.warning("Slot already exists.")
-        else:
-            update_schedule(str(slot_date), slot_time)
-            st.success("Slot added!")
+    mode = st.radio("Mode", ["Single Slot", "Bulk"], horizontal=True)
+
+    if mode == "Single Slot":
+        slot_date = st.date_input("Available Date")
+        slot_time = st.selectbox("Available Time", TIME_SLOTS)
+        if st.button("Add Slot"):
+            if add_schedule_slots([(str(slot_date), slot_time)]):
+                st.success("Slot added!")
+                st.rerun()
+            else:
+                st.warning("Slot already exists.")
+    else:
+        weekday_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+        start_date = st.date_input("From Date")
+        end_date = st.date_input("To Date", value=start_date + timedelta(days=27))
+        weekdays = st.multiselect("Weekdays", weekday_names, default=weekday_names[:5])
+        times = st.multiselect("Time Slots", TIME_SLOTS, default=TIME_SLOTS)
+
+        days = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+        bulk_slots = [
+            (str(day), slot_time)
+            for day in days if weekday_names[day.weekday()] in weekdays
+            for slot_time in times
+        ]
+        st.caption(f"{len(bulk_slots)} slots in range (existing ones are skipped).")
+
+        if st.button("Add Slots", disabled=not bulk_slots):
+            added = add_schedule_slots(bulk_slots)
+            st.success(f"{added} slots added, {len(bulk_slots) - added} already existed.")
             st.rerun()
 
 elif choice == "Available Slots":
@@ -289,17 +376,25 @@ elif choice == "Available Slots":
         st.info("No slots available.")
     else:
         df_slots = pd.DataFrame(schedule)
+        selected_slots = []
 
         for idx, row in df_slots.iterrows():
-            cols = st.columns([3, 3, 1])
-            cols[0].write(f"📅 Date: **{row['Date']}**")
-            cols[1].write(f"🕒 Time: **{row['Time']}**")
-            if cols[2].button("❌ Delete", key=f"delete_slot_{idx}"):
-                from google_sheets import remove_schedule_slot
+            cols = st.columns([0.5, 3, 3, 1])
+            # Keyed by the slot itself so selections stay put when rows above are deleted
+            if cols[0].checkbox("Select", key=f"select_slot_{row['Date']}_{row['Time']}", label_visibility="collapsed"):
+                selected_slots.append((row['Date'], row['Time']))
+            cols[1].write(f"📅 Date: **{row['Date']}**")
+            cols[2].write(f"🕒 Time: **{row['Time']}**")
+            if cols[3].button("❌ Delete", key=f"delete_slot_{idx}"):
                 remove_schedule_slot(row['Date'], row['Time'])
                 st.success(f"Slot on {row['Date']} at {row['Time']} deleted.")
                 st.rerun()
 
+        if st.button(f"🗑️ Delete Selected ({len(selected_slots)})", disabled=not selected_slots):
+            removed = remove_schedule_slots(selected_slots)
+            st.success(f"{removed} slots deleted.")
+            st.rerun()
+
 
 # --------------------------------------------
 # Add Report
@@ -321,34 +416,31 @@ elif choice == "Add Report":
     st.markdown("---")
     st.subheader("📄 View Submitted Reports")
 
-    reports = get_all_reports()
-    appointments = get_appointments()
-
-    # Create a mapping of appointmentID to customerID
-    appt_to_customer = {str(a["appointmentID"]): str(a["customerID"]) for a in appointments}
-
-    # Attach customerID to each report
-    for rep in reports:
-        rep["customerID"] = appt_to_customer.get(str(rep["appointmentID"]), "Unknown")
-
-    # Filter Options
-    customer_ids = sorted(set(r["customerID"] for r in reports if r["customerID"] != "Unknown"))
-    appt_ids = sorted(set(r["appointmentID"] for r in reports))
-
-    selected_cust_id = st.selectbox("🔍 Filter by Customer ID", ["All"] + customer_ids)
-    selected_appt_id = st.selectbox("📎 Filter by Appointment ID", ["All"] + appt_ids)
-
-    # Apply filters
-    filtered_reports = reports
-    if selected_cust_id != "All":
-        filtered_reports = [r for r in filtered_reports if r["customerID"] == selected_cust_id]
-    if selected_appt_id != "All":
-        filtered_reports = [r for r in filtered_reports if r["appointmentID"] == selected_appt_id]
-
-    if not filtered_reports:
+    customer_ids, appt_ids = filter_options()
+
+    query = st.text_input("🔎 Search report content")
+    filter_cols = st.columns(2)
+    selected_cust_id = filter_cols[0].selectbox("🔍 Filter by Customer ID", ["All"] + customer_ids)
+    selected_appt_id = filter_cols[1].selectbox("📎 Filter by Appointment ID", ["All"] + appt_ids)
+    date_range = st.date_input("📅 Filter by Report Date", value=())
+    page_size = st.selectbox("Reports per page", [10, 25, 50])
+    page = st.number_input("Page", min_value=1, value=1, step=1, key="report_page")
+
+    page_reports, page, page_count, total = search_reports(
+        query,
+        customer_id=None if selected_cust_id == "All" else selected_cust_id,
+        appointment_id=None if selected_appt_id == "All" else selected_appt_id,
+        date_from=date_range[0] if len(date_range) == 2 else None,
+        date_to=date_range[1] if len(date_range) == 2 else None,
+        page=page,
+        page_size=page_size,
+    )
+
+    if not page_reports:
         st.info("No matching reports found.")
     else:
-        for rep in filtered_reports:
+        st.markdown(f"### Showing {len(page_reports)} of {total} reports (page {page} of {page_count})")
+        for rep in page_reports:
             st.markdown(f"""
                 <div style="border: 1px solid #ccc; padding: 10px; margin-bottom: 10px; border-radius: 5px; background-color: #f8f8f8;">
                     <strong>📋 Report ID:</strong> {rep['reportID']}<br>
@@ -360,6 +452,113 @@ elif choice == "Add Report":
                 </div>
             """, unsafe_allow_html=True)
 
+# --------------------------------------------
+# Analytics
+elif choice == "Analytics":
+    st.subheader("📊 Analytics")
+    from analytics import get_analytics
+
+    stats = get_analytics()
+    if not stats["total_appointments"]:
+        st.info("No appointments yet.")
+    else:
+        cols = st.columns(4)
+        cols[0].metric("Appointments", stats["total_appointments"])
+        cols[1].metric("Cancellation Rate", f"{stats['cancellation_rate']:.0%}")
+        cols[2].metric("No-show Rate", f"{stats['no_show_rate']:.0%}", help="Past appointments never marked Completed or Cancelled")
+        lead = stats["lead_time_median"]
+        cols[3].metric("Median Days to Report", "—" if lead is None else f"{lead:.0f}")
+
+        st.markdown("### Status Breakdown")
+        st.bar_chart(stats["status_counts"])
+
+        st.markdown("### Utilization by Day")
+        st.line_chart(stats["utilization_by_day"]["Utilization"])
+
+        st.markdown("### Utilization by Time Slot")
+        st.dataframe(stats["utilization_by_slot"], use_container_width=True)
+
+        st.markdown("### Visits per Customer")
+        st.dataframe(stats["customer_visits"], use_container_width=True)
+
+# --------------------------------------------
+# API Stats (admin)
+elif choice == "API Stats":
+    st.subheader("📡 API Calls & Latency")
+    import instrumentation
+
+    data = instrumentation.snapshot()
+    calls = pd.DataFrame(data["calls"], columns=["kind", "name", "page", "calls", "time", "max_time", "rows"])
+    runs = pd.DataFrame(data["recent_runs"], columns=[
+        "page", "started", "api_calls", "api_time", "api_rows", "function_calls",
+        "reads", "duplicate_reads", "fetches_saved",
+    ])
+
+    if calls.empty:
+        st.info("No calls recorded yet.")
+    else:
+        api = calls[calls["kind"] == "api"]
+        cols = st.columns(3)
+        cols[0].metric("API Calls", int(api["calls"].sum()))
+        cols[1].metric("API Time", f"{api['time'].sum():.2f} s")
+        cols[2].metric("Rows Transferred", int(api["rows"].sum()))
+
+        st.markdown("### API Calls by Page")
+        st.dataframe(api.groupby("page")[["calls", "time", "rows"]].sum().sort_values("calls", ascending=False), use_container_width=True)
+
+        st.markdown("### All Calls")
+        st.dataframe(calls.assign(avg_time=calls["time"] / calls["calls"]).sort_values("time", ascending=False), use_container_width=True)
+
+    import write_queue
+    st.markdown("### Write Queue")
+    cols = st.columns(5)
+    cols[0].metric("Pending Writes", write_queue.pending())
+    cols[1].metric("Flushed", write_queue.stats["flushed"])
+    cols[2].metric("Retries", write_queue.stats["retries"])
+    cols[3].metric("Dropped", write_queue.stats["failed"])
+    cols[4].metric("Skipped (Row Gone)", write_queue.stats["skipped"])
+    if write_queue.failures:
+        failures = pd.DataFrame(list(write_queue.failures)[::-1])
+        failures["dropped_at"] = pd.to_datetime(failures["dropped_at"], unit="s")
+        st.dataframe(failures, use_container_width=True)
+
+    import drive_uploads
+    st.markdown("### Drive Uploads")
+    cols = st.columns(5)
+    cols[0].metric("Pending Uploads", drive_uploads.pending_uploads())
+    cols[1].metric("Uploaded", drive_uploads.stats["uploaded"])
+    cols[2].metric("Already in Drive", drive_uploads.stats["skipped"])
+    cols[3].metric("Failed", drive_uploads.stats["failed"])
+    cols[4].metric("Retried", drive_uploads.stats["retried"])
+    failed_uploads = drive_uploads.failed_uploads()
+    if failed_uploads:
+        failed_uploads = pd.DataFrame(failed_uploads)
+        failed_uploads["failed_at"] = pd.to_datetime(failed_uploads["failed_at"], unit="s")
+        st.dataframe(failed_uploads, use_container_width=True)
+        if st.button(f"🔁 Retry Failed Uploads ({len(failed_uploads)})"):
+            drive_uploads.retry_failed_uploads()
+            st.rerun()
+
+    import request_context
+    st.markdown("### Per-Rerun Read Dedup")
+    context_stats = request_context.get_stats()
+    cols = st.columns(3)
+    cols[0].metric("Sheet Reads", context_stats["reads"])
+    cols[1].metric("Duplicate Reads Eliminated", context_stats["duplicate_reads"])
+    cols[2].metric("Refetches Avoided", context_stats["fetches_saved"])
+
+    st.markdown("### Recent Reruns")
+    if not runs.empty:
+        runs["started"] = pd.to_datetime(runs["started"], unit="s")
+        st.dataframe(runs.iloc[::-1], use_container_width=True)
+
+    cols = st.columns(3)
+    cols[0].download_button("⬇️ JSON", instrumentation.export_json(), file_name="api_stats.json", mime="application/json")
+    cols[1].download_button("⬇️ CSV", instrumentation.export_csv(), file_name="api_stats.csv", mime="text/csv")
+    if cols[2].button("Reset"):
+        instrumentation.reset()
+        st.rerun()
+
 # --------------------------------------------
 # Logout
 elif choice == "Logout":
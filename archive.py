@@ -0,0 +1,44 @@
+import argparse
+from datetime import date, timedelta
+
+from config import get_setting, write_queue_off
+from slots import parse_date
+
+# Completed and cancelled appointments are never edited again. Once they are
+# older than ARCHIVE_AFTER_DAYS, they and their reports are moved out of the
+# hot Appointments/Reports tables into one archive partition per month
+# ("Appointments_2024-01", "Reports_2024-01", ...). Archived rows stay
+# readable through get_archived_appointments/get_archived_reports in storage.
+#
+#   python archive.py              # archive everything past ARCHIVE_AFTER_DAYS
+#   python archive.py --days 30
+ARCHIVE_AFTER_DAYS = int(get_setting("ARCHIVE_AFTER_DAYS", 90))
+TERMINAL_STATUSES = {"Completed", "Cancelled"}
+
+
+def cutoff_date(older_than_days=None, today=None):
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    return (today or date.today()) - timedelta(days=days)
+
+def archive_month(record):
+    return parse_date(record.get("Date")).strftime("%Y-%m")
+
+def archivable(record, cutoff):
+    day = parse_date(record.get("Date"))
+    return record.get("Status") in TERMINAL_STATUSES and day is not None and day < cutoff
+
+def archive_title(sheet, month):
+    return f"{sheet}_{month}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old completed/cancelled appointments into monthly archives.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive appointments older than this")
+    args = parser.parse_args()
+
+    write_queue_off()
+    from storage import archive_appointments
+    moved = archive_appointments(older_than_days=args.days)
+    import write_queue
+    write_queue.flush()
+    print(f"Archived {moved} appointments dated before {cutoff_date(args.days)}")
@@ -1,36 +1,67 @@
-import gspread
-from google.oauth2.service_account import Credentials
 import json
-import streamlit as st
-import re
+from events import DerivedIndex
+from google_sheets import append_row, ensure_fresh, get_records
+from instrumentation import instrument
 
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-sservice_account_info = st.secrets["GOOGLE_SERVICE_ACCOUNT"]
-creds = Credentials.from_service_account_info(service_account_info, scopes=scope)
-client = gspread.authorize(creds)
-spreadsheet = client.open_by_key(st.secrets["SPREADSHEET_ID"])
 
+def _build(users, customers):
+    directory = {"users": [], "by_username": {}, "by_email": {}, "customer_ids": {}}
+    for user in users:
+        _add_user(directory, user)
+    for customer in customers:
+        _add_customer(directory, customer)
+    return directory
+
+def _add_user(directory, user):
+    position = len(directory["users"])
+    directory["users"].append(user)
+    directory["by_username"].setdefault(str(user["Username"]), []).append(position)
+    directory["by_email"].setdefault(str(user["Email"]), []).append(position)
+
+def _add_customer(directory, customer):
+    directory["customer_ids"].setdefault(str(customer["customerUsername"]), str(customer["customerID"]))
+
+def _apply(directory, sheet, action, record, previous):
+    if action != "append":
+        return False
+    if sheet == "Users":
+        _add_user(directory, record)
+    else:
+        _add_customer(directory, record)
+
+# Hashed lookups over the cached Users and Customers sheets, shared by every
+# session. Appends from register_user/save_customer are folded in as they
+# happen; any other change drops the directory and it is rebuilt on next use.
+_directory = DerivedIndex(
+    ("Users", "Customers"), ensure_fresh,
+    lambda: _build(get_records("Users"), get_records("Customers")), _apply,
+)
+
+
+@instrument
 def register_user(username, password, role, email):
-    worksheet = spreadsheet.worksheet("Users")
-    worksheet.append_row([username, password, role, email])
+    append_row("Users", [username, password, role, email])
 
+@instrument
 def login_user(username_or_email, password):
-    worksheet = spreadsheet.worksheet("Users")
-    for user in worksheet.get_all_records():
-        if (user["Username"] == username_or_email or user["Email"] == username_or_email) and user["Password"] == password:
-            return user["Role"], user["Username"], user["Email"]
+    directory = _directory.get()
+    key = str(username_or_email)
+    with _directory.lock:
+        positions = sorted(set(directory["by_username"].get(key, []) + directory["by_email"].get(key, [])))
+        for position in positions:
+            user = directory["users"][position]
+            if str(user["Password"]) == str(password):
+                return user["Role"], user["Username"], user["Email"]
     return None, None, None
 
+@instrument
 def get_customer_id(username):
-    worksheet = spreadsheet.worksheet("Customers")
-    for record in worksheet.get_all_records():
-        if record["customerUsername"] == username:
-            return str(record["customerID"])
-    return None
+    directory = _directory.get()
+    with _directory.lock:
+        return directory["customer_ids"].get(str(username))
 
+@instrument
 def check_email_exists(email):
-    worksheet = spreadsheet.worksheet("Users")
-    return any(user["Email"] == email for user in worksheet.get_all_records())
-
-def check_password_complexity(password):
-    return len(password) >= 8 and re.search(r"[!@#$%^&*(),.?\":{}|<>]", password)
+    directory = _directory.get()
+    with _directory.lock:
+        return str(email) in directory["by_email"]
@@ -0,0 +1,98 @@
+import bisect
+from datetime import date as date_cls
+
+from events import DerivedIndex
+from storage import ensure_fresh, get_appointments, get_pharmacist_schedule
+from slots import time_sort_key
+
+# Appointments in these states no longer hold on to their slot.
+RELEASED_STATUSES = {"Cancelled"}
+
+
+def _is_booked(appt):
+    return appt.get("Status") not in RELEASED_STATUSES
+
+def _build(schedule, appointments):
+    slots = {}
+    for s in schedule:
+        times = slots.setdefault(str(s["Date"]), [])
+        if str(s["Time"]) not in times:
+            times.append(str(s["Time"]))
+    for times in slots.values():
+        times.sort(key=time_sort_key)
+    booked = {(str(a["Date"]), str(a["Time"])) for a in appointments if _is_booked(a)}
+    return {"slots": slots, "dates": sorted(slots), "booked": booked}
+
+def _add_slot(index, date, time):
+    times = index["slots"].get(date)
+    if times is None:
+        times = index["slots"][date] = []
+        bisect.insort(index["dates"], date)
+    if time not in times:
+        times.append(time)
+        times.sort(key=time_sort_key)
+
+def _remove_slot(index, date, time):
+    times = index["slots"].get(date)
+    if times and time in times:
+        times.remove(time)
+        if not times:
+            del index["slots"][date]
+            index["dates"].remove(date)
+
+def _apply(index, sheet, action, record, previous):
+    key = (str(record["Date"]), str(record["Time"]))
+    if sheet == "Schedules":
+        if action == "append":
+            _add_slot(index, *key)
+        elif action == "delete":
+            _remove_slot(index, *key)
+        return
+
+    if previous is not None and _is_booked(previous):
+        index["booked"].discard((str(previous["Date"]), str(previous["Time"])))
+    if action == "delete":
+        index["booked"].discard(key)
+    elif _is_booked(record):
+        index["booked"].add(key)
+
+# date -> sorted list of schedule times, the sorted list of those dates, and
+# the (date, time) pairs taken by live appointments. Built lazily from the
+# cached sheets and kept current from storage change events.
+_index = DerivedIndex(
+    ("Schedules", "Appointments"), ensure_fresh,
+    lambda: _build(get_pharmacist_schedule(), get_appointments()), _apply,
+)
+
+
+def _free_times(index, date):
+    return [t for t in index["slots"].get(date, ()) if (date, t) not in index["booked"]]
+
+def is_free(date, time):
+    index = _index.get()
+    date, time = str(date), str(time)
+    with _index.lock:
+        return time in index["slots"].get(date, ()) and (date, time) not in index["booked"]
+
+def free_slots(date):
+    index = _index.get()
+    with _index.lock:
+        return _free_times(index, str(date))
+
+def available_dates(from_date=None):
+    index = _index.get()
+    with _index.lock:
+        start = bisect.bisect_left(index["dates"], str(from_date)) if from_date else 0
+        return [d for d in index["dates"][start:] if _free_times(index, d)]
+
+def next_free_slots(n, from_date=None):
+    index = _index.get()
+    from_date = str(from_date or date_cls.today())
+    result = []
+    with _index.lock:
+        for d in index["dates"][bisect.bisect_left(index["dates"], from_date):]:
+            for t in _free_times(index, d):
+                result.append((d, t))
+                if len(result) == n:
+                    return result
+    return result
@@ -0,0 +1,113 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+# Offline benchmark of the main app flows against fake_gspread, so no Google
+# credentials are needed. For each sheet size it reports the Sheets API calls
+# and wall time of every flow, cold (empty cache) and warm.
+#
+#   python benchmark.py                      # 1k, 10k and 100k appointments
+#   python benchmark.py --sizes 1000 --latency 0.2 --quota 60
+
+_scratch = tempfile.mkdtemp(prefix="bench-")
+os.environ.setdefault("WRITE_QUEUE_FILE", os.path.join(_scratch, "pending_writes.jsonl"))
+import id_allocator
+id_allocator.SEQUENCE_FILE = os.path.join(_scratch, "id_sequences.json")
+
+import availability
+import connection
+import google_sheets
+import reservations
+import write_queue
+from auth import get_customer_id, login_user
+from fake_gspread import START, FakeSpreadsheet, build_sheets
+from pagination import paginate
+
+def flow_booking(ctx):
+    date_, time_ = availability.next_free_slots(1, from_date=START)[0]
+    assert google_sheets.save_appointment([str(ctx["customer"]), date_, time_, "Pending Confirmation"]) is not None
+
+def flow_reschedule(ctx):
+    dates = availability.available_dates()
+    new_date = dates[-1]
+    new_time = availability.free_slots(new_date)[0]
+    google_sheets.update_appointment_status(ctx["appointment"], "Rescheduled", new_date, new_time)
+
+def flow_login(ctx):
+    role, username, _ = login_user(f"user{ctx['customer']}@example.com", "secret!123")
+    assert role == "Customer"
+    assert get_customer_id(username) == str(ctx["customer"])
+
+def flow_manage(ctx):
+    appointments = google_sheets.get_appointments()
+    customers = {str(c["customerID"]): c for c in google_sheets.get_all_customers()}
+    pending = [a for a in appointments if a["Status"] == "Pending Confirmation"]
+    page, _, _ = paginate(sorted(pending, key=lambda a: a["Date"], reverse=True), 1, 25)
+    [customers.get(str(a["customerID"])) for a in page]
+    google_sheets.update_appointments([{"appointment_id": a["appointmentID"], "new_status": "Confirmed"} for a in page[:10]])
+
+FLOWS = [("booking", flow_booking), ("reschedule", flow_reschedule), ("login", flow_login), ("manage", flow_manage)]
+
+
+def run_flow(fake, fn, ctx, cold):
+    if cold:
+        google_sheets.invalidate_cache()
+    fake.reset_calls()
+    start = time.perf_counter()
+    fn(ctx)
+    elapsed = time.perf_counter() - start
+    # Queued writes count towards the flow's calls, not its response time.
+    write_queue.flush()
+    return fake.total_calls(), elapsed
+
+def stress_booking(fake, threads):
+    # Every thread tries to book every open slot; each slot must be booked exactly once.
+    slots = availability.next_free_slots(10 ** 9, from_date=START)
+    booked = []
+
+    def worker(i):
+        for date_, time_ in slots:
+            if google_sheets.save_appointment([str(i), date_, time_, "Pending Confirmation"]) is not None:
+                booked.append((date_, time_))
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    write_queue.flush()
+    return len(slots), len(booked), len(booked) - len(set(booked))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app flows against an in-memory fake spreadsheet.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per API request")
+    parser.add_argument("--quota", type=int, default=None, help="simulated requests per minute")
+    parser.add_argument("--stress-threads", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'flow':<12} {'cold calls':>10} {'cold ms':>9} {'warm calls':>10} {'warm ms':>9}")
+    for size in args.sizes:
+        sheets, n_customers = build_sheets(size)
+        fake = FakeSpreadsheet(sheets, latency=args.latency, quota_per_minute=args.quota)
+        connection.use_spreadsheet(fake)
+        google_sheets.invalidate_cache()
+        id_allocator.reset_sequence()
+        reservations.set_backend(reservations.MemoryReservations())
+        ctx = {"customer": n_customers // 2, "appointment": size // 2}
+
+        for name, fn in FLOWS:
+            cold_calls, cold_time = run_flow(fake, fn, ctx, cold=True)
+            warm_calls, warm_time = run_flow(fake, fn, ctx, cold=False)
+            print(f"{size:>8} {name:<12} {cold_calls:>10} {cold_time * 1000:>9.1f} {warm_calls:>10} {warm_time * 1000:>9.1f}")
+
+        if args.stress_threads:
+            fake.latency = 0
+            slots, booked, doubles = stress_booking(fake, args.stress_threads)
+            print(f"{size:>8} {'stress':<12} {args.stress_threads} threads: {booked}/{slots} slots booked, {doubles} double bookings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import os
+import streamlit as st
+
+
+def get_setting(name, default=None):
+    # Environment variables win over .streamlit/secrets.toml so offline runs
+    # and scripts can switch settings without a secrets file.
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        return st.secrets.get(name, default)
+    except FileNotFoundError:
+        return default
+
+def write_queue_off():
+    # For command-line scripts, before anything imports write_queue: their
+    # writes go straight to the API, and a private (never created) queue file
+    # keeps them clear of the running app's.
+    os.environ["WRITE_QUEUE"] = "off"
+    os.environ["WRITE_QUEUE_FILE"] = f"pending_writes.jsonl.{os.getpid()}"
@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+import pytest
+
+# write_queue locks its file at import; keep the test run off the app's.
+os.environ["WRITE_QUEUE_FILE"] = os.path.join(tempfile.mkdtemp(prefix="tests-"), "pending_writes.jsonl")
+
+import connection
+import google_sheets
+import id_allocator
+import reservations
+import write_queue
+from fake_gspread import FakeSpreadsheet, build_sheets
+
+
+@pytest.fixture
+def fake_sheets(tmp_path, monkeypatch):
+    # A fresh in-memory spreadsheet (see fake_gspread.build_sheets) behind the
+    # Sheets backend, with the ID sequences and write queue kept in tmp_path.
+    monkeypatch.setattr(id_allocator, "SEQUENCE_FILE", str(tmp_path / "id_sequences.json"))
+    monkeypatch.setattr(write_queue, "QUEUE_FILE", str(tmp_path / "pending_writes.jsonl"))
+    monkeypatch.setattr(write_queue, "FLUSH_DELAY", 0)
+    reservations.set_backend(reservations.MemoryReservations())
+    sheets, _ = build_sheets(1000)
+    fake = FakeSpreadsheet(sheets)
+    connection.use_spreadsheet(fake)
+    google_sheets.invalidate_cache()
+    yield fake
+    assert write_queue.flush(timeout=10)
+    google_sheets.invalidate_cache()
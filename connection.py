@@ -0,0 +1,58 @@
+import threading
+
+import gspread
+import streamlit as st
+from google.oauth2.service_account import Credentials
+
+from instrumentation import InstrumentedProxy
+
+# One set of credentials, one gspread client and one opened spreadsheet per
+# process, created on first use rather than at import time. Worksheet handles
+# are memoized so spreadsheet.worksheet(name) (an API call) runs once per sheet.
+# Every handle is wrapped so each gspread request shows up in instrumentation.
+scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+_lock = threading.RLock()
+_state = {}
+_worksheets = {}
+
+
+def get_credentials():
+    with _lock:
+        if "creds" not in _state:
+            _state["creds"] = Credentials.from_service_account_info(st.secrets["GOOGLE_SERVICE_ACCOUNT"], scopes=scope)
+        return _state["creds"]
+
+def get_client():
+    with _lock:
+        if "client" not in _state:
+            _state["client"] = InstrumentedProxy(gspread.authorize(get_credentials()), "client")
+        return _state["client"]
+
+def get_spreadsheet():
+    with _lock:
+        if "spreadsheet" not in _state:
+            _state["spreadsheet"] = InstrumentedProxy(get_client().open_by_key(st.secrets["SPREADSHEET_ID"]), "spreadsheet")
+        return _state["spreadsheet"]
+
+def get_worksheet(name):
+    with _lock:
+        if name not in _worksheets:
+            _worksheets[name] = InstrumentedProxy(get_spreadsheet().worksheet(name), name)
+        return _worksheets[name]
+
+def get_folder_id():
+    return st.secrets["FOLDER_ID"]
+
+def use_spreadsheet(spreadsheet):
+    # Point the whole app at another spreadsheet object, e.g. fake_gspread.FakeSpreadsheet.
+    with _lock:
+        _state.clear()
+        _worksheets.clear()
+        _state["spreadsheet"] = InstrumentedProxy(spreadsheet, "spreadsheet")
+
+def reset():
+    # Drop everything, e.g. after credentials rotate or a worksheet is recreated.
+    with _lock:
+        _state.clear()
+        _worksheets.clear()
@@ -0,0 +1,55 @@
+from events import DerivedIndex
+from storage import ensure_fresh, get_appointments
+
+ACTIVE_STATUSES = ("Pending Confirmation", "Confirmed", "Rescheduled")
+PAST_STATUSES = ("Cancelled", "Completed")
+
+
+def _build(appointments):
+    index = {"by_customer": {}, "views": {}}
+    for appt in appointments:
+        _add(index, appt)
+    return index
+
+def _add(index, appt):
+    cid = str(appt.get("customerID"))
+    index["by_customer"].setdefault(cid, {})[str(appt.get("appointmentID"))] = dict(appt)
+    index["views"].pop(cid, None)
+
+def _remove(index, appt):
+    cid = str(appt.get("customerID"))
+    appointments = index["by_customer"].get(cid)
+    if appointments is not None:
+        appointments.pop(str(appt.get("appointmentID")), None)
+    index["views"].pop(cid, None)
+
+def _apply(index, sheet, action, record, previous):
+    if action == "delete":
+        _remove(index, record)
+    else:
+        # Same customer: replaced in place, so the appointment keeps its position.
+        if previous is not None and str(previous.get("customerID")) != str(record.get("customerID")):
+            _remove(index, previous)
+        _add(index, record)
+
+# customerID -> {appointmentID: appointment}, in sheet order, plus the active
+# and past lists per customer, computed on first use. Kept current from
+# storage change events like the availability index, so a customer's page
+# only touches their own appointments.
+_index = DerivedIndex(("Appointments",), ensure_fresh, lambda: _build(get_appointments()), _apply)
+
+
+def customer_appointments(customer_id):
+    # {"active": [...], "past": [...]} for one customer.
+    index = _index.get()
+    cid = str(customer_id)
+    with _index.lock:
+        views = index["views"].get(cid)
+        if views is None:
+            appointments = index["by_customer"].get(cid, {}).values()
+            views = {
+                "active": [a for a in appointments if a.get("Status") in ACTIVE_STATUSES],
+                "past": [a for a in appointments if a.get("Status") in PAST_STATUSES],
+            }
+            index["views"][cid] = views
+        return {name: [dict(a) for a in appts] for name, appts in views.items()}
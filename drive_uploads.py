@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaFileUpload
+
+from config import get_setting
+from connection import get_credentials, get_folder_id
+
+# Referral letters are written to UPLOAD_DIR/<SHA-256 of the content>/<original
+# name>, so re-uploading the same file is a no-op, two different files with the
+# same original name no longer overwrite each other, and the download keeps the
+# name the customer gave it. Copying to Drive happens on a small background
+# pool so booking returns immediately.
+# Failed uploads are logged and kept in failed_uploads() until
+# retry_failed_uploads() (the API Stats page) sends them again.
+UPLOAD_DIR = get_setting("UPLOAD_DIR", "uploads")
+CHUNK_SIZE = 5 * 1024 * 1024  # must be a multiple of 256 KiB for resumable uploads
+UPLOAD_RETRIES = 3
+
+_executor = ThreadPoolExecutor(max_workers=int(get_setting("UPLOAD_WORKERS", 2)), thread_name_prefix="drive-upload")
+_uploads = {}  # content hash -> Future resolving to the Drive file ID
+_failed = {}  # content hash -> the failed upload, for retry_failed_uploads()
+_lock = threading.Lock()
+_local = threading.local()
+_service_factory = None
+_service_generation = 0
+stats = {"uploaded": 0, "skipped": 0, "failed": 0, "retried": 0}
+log = logging.getLogger(__name__)
+
+
+def set_drive_service(factory):
+    # Swap in another Drive client (e.g. a local fake exposing
+    # files().create(...).next_chunk()) for tests and offline runs.
+    global _service_factory, _service_generation
+    _service_factory = factory
+    _service_generation += 1
+
+def get_drive_service():
+    # httplib2 isn't thread-safe, so each worker thread keeps its own client
+    # (rebuilt after set_drive_service).
+    if getattr(_local, "generation", None) != _service_generation:
+        if _service_factory is not None:
+            _local.service = _service_factory()
+        else:
+            _local.service = build("drive", "v3", credentials=get_credentials(), cache_discovery=False)
+        _local.generation = _service_generation
+    return _local.service
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def referral_location(data, original_name):
+    # (local path, content hash) a referral is stored under, without writing
+    # it, so the path can go on an appointment before the file is kept.
+    digest = content_hash(bytes(data))
+    name = os.path.basename(str(original_name).replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        name = "referral"
+    return os.path.join(UPLOAD_DIR, digest, name), digest
+
+def store_referral(data, original_name):
+    # Returns (local path, content hash). Existing identical files are reused.
+    data = bytes(data)
+    path, digest = referral_location(data, original_name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path, digest
+
+def upload_file(file_path, name=None):
+    metadata = {
+        "name": name or os.path.basename(file_path),
+        "parents": [get_folder_id()]
+    }
+    mimetype, _ = mimetypes.guess_type(file_path)
+    media = MediaFileUpload(file_path, mimetype=mimetype, chunksize=CHUNK_SIZE, resumable=True)
+    request = get_drive_service().files().create(body=metadata, media_body=media, fields="id")
+    response = None
+    while response is None:
+        _, response = request.next_chunk(num_retries=UPLOAD_RETRIES)
+    return response.get("id")
+
+def submit_upload(file_path, digest, name=None, on_complete=None, existing=None):
+    # Queues file_path for upload and returns its Future; a file whose
+    # content was already queued in this process shares the earlier Future.
+    # existing() is asked first, on the worker, for the Drive file ID an
+    # earlier run already recorded for this file (e.g. in Files); when it has
+    # one, nothing is uploaded and on_complete isn't called.
+    with _lock:
+        future = _uploads.get(digest)
+        if future is not None and not (future.done() and future.exception()):
+            return future
+        return _submit(digest, file_path, name, on_complete, existing)
+
+def _submit(digest, file_path, name, on_complete, existing, file_id=None):
+    # Caller holds _lock.
+    _failed.pop(digest, None)
+    future = _executor.submit(_run_upload, digest, file_path, name, on_complete, existing, file_id)
+    _uploads[digest] = future
+    return future
+
+def _run_upload(digest, file_path, name, on_complete, existing, file_id=None):
+    # file_id is set when a retry only needs to rerun on_complete.
+    try:
+        if file_id is None:
+            recorded = existing() if existing is not None else None
+            if recorded:
+                with _lock:
+                    stats["skipped"] += 1
+                return recorded
+            file_id = upload_file(file_path, name)
+        if on_complete is not None:
+            on_complete(file_id)
+    except Exception as e:
+        log.error("Drive upload of %s failed: %s", file_path, e)
+        with _lock:
+            stats["failed"] += 1
+            _failed[digest] = {
+                "file_path": file_path, "name": name, "on_complete": on_complete, "existing": existing,
+                "file_id": file_id, "error": str(e), "failed_at": time.time(),
+            }
+        raise
+    with _lock:
+        stats["uploaded"] += 1
+    return file_id
+
+def pending_uploads():
+    with _lock:
+        return sum(1 for future in _uploads.values() if not future.done())
+
+def failed_uploads():
+    with _lock:
+        return [
+            {"file_path": u["file_path"], "name": u["name"], "uploaded": u["file_id"] is not None,
+             "error": u["error"], "failed_at": u["failed_at"]}
+            for u in _failed.values()
+        ]
+
+def retry_failed_uploads():
+    # Resubmits every failed upload and returns how many. A file that already
+    # reached Drive isn't sent again; only its on_complete is rerun.
+    with _lock:
+        failed = list(_failed.items())
+        for digest, u in failed:
+            _submit(digest, u["file_path"], u["name"], u["on_complete"], u["existing"], u["file_id"])
+        stats["retried"] += len(failed)
+        return len(failed)
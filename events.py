@@ -0,0 +1,86 @@
+import threading
+
+# Change notifications from the storage layer. Callbacks receive
+# (sheet, action, record, previous) where action is "append", "update",
+# "delete" or "reload"; on "reload" the whole sheet should be treated as new.
+_subscribers = []
+_version = 0
+_lock = threading.Lock()
+
+
+def subscribe(callback):
+    with _lock:
+        _subscribers.append(callback)
+    return callback
+
+def publish(sheet, action, record=None, previous=None):
+    global _version
+    with _lock:
+        _version += 1
+        subscribers = list(_subscribers)
+    for callback in subscribers:
+        callback(sheet, action, record, previous)
+
+def data_version():
+    # Bumped on every change; lets derived results be memoized until the data moves.
+    return _version
+
+
+MAX_BUILD_ATTEMPTS = 3
+
+class DerivedIndex:
+    # An in-memory structure built from some sheets and kept current from
+    # their change events. build() reads the sheets and returns a new index;
+    # apply(index, sheet, action, record, previous) folds one append, update
+    # or delete into it, or returns False when it can't (the index is then
+    # rebuilt on next use, as after a "reload"). Readers call get() and look
+    # at the result under .lock.
+    def __init__(self, sheets, ensure_fresh, build, apply):
+        self.sheets = tuple(sheets)
+        self.lock = threading.Lock()
+        self._ensure_fresh = ensure_fresh
+        self._build = build
+        self._apply = apply
+        self._index = None
+        self._generation = 0
+        self._building = threading.local()
+        subscribe(self._on_change)
+
+    def get(self):
+        # A stale snapshot reloading here publishes a "reload" event, which
+        # clears the index before we look at it.
+        self._ensure_fresh(*self.sheets)
+        for _ in range(MAX_BUILD_ATTEMPTS):
+            with self.lock:
+                if self._index is not None:
+                    return self._index
+                generation = self._generation
+            # Build without holding our lock (the reads take the storage lock,
+            # which publishers hold while calling _on_change) and only keep the
+            # result if no change landed in the meantime.
+            self._building.active = True
+            try:
+                index = self._build()
+            finally:
+                self._building.active = False
+            with self.lock:
+                if generation == self._generation:
+                    self._index = index
+                    return index
+        # Still changing under us (e.g. CACHE_TTL=0): serve this build without keeping it.
+        return index
+
+    def _on_change(self, sheet, action, record, previous):
+        if sheet not in self.sheets:
+            return
+        with self.lock:
+            if action == "reload" and getattr(self._building, "active", False):
+                # This thread's build is reading the reloaded snapshot; drop any
+                # older index but don't make the build start over.
+                self._index = None
+                return
+            self._generation += 1
+            if self._index is None:
+                return
+            if action == "reload" or self._apply(self._index, sheet, action, record, previous) is False:
+                self._index = None
@@ -0,0 +1,52 @@
+import itertools
+import threading
+
+from fake_gspread import FakeAPIError
+
+# In-memory stand-in for the Drive v3 service used by drive_uploads, for
+# tests and offline runs:
+#
+#   drive = FakeDrive()
+#   drive_uploads.set_drive_service(lambda: drive)
+#
+# Uploads finish in a single next_chunk() call. The next `fail_next` uploads
+# raise a 500, as if the client had run out of retries.
+
+
+class FakeDrive:
+    def __init__(self, fail_next=0):
+        self.fail_next = fail_next
+        self.files_created = {}  # file ID -> {"name", "parents", "content"}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def files(self):
+        return _FakeFiles(self)
+
+
+class _FakeFiles:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def create(self, body=None, media_body=None, fields=None):
+        return _FakeUpload(self._drive, body or {}, media_body)
+
+
+class _FakeUpload:
+    def __init__(self, drive, body, media_body):
+        self._drive = drive
+        self._body = body
+        self._media = media_body
+
+    def next_chunk(self, num_retries=0):
+        drive = self._drive
+        with drive._lock:
+            if drive.fail_next:
+                drive.fail_next -= 1
+                raise FakeAPIError(500, "Backend Error (simulated)")
+            file_id = f"fake-{next(drive._ids)}"
+            content = self._media.getbytes(0, self._media.size()) if self._media is not None else b""
+            drive.files_created[file_id] = {
+                "name": self._body.get("name"), "parents": self._body.get("parents", []), "content": content,
+            }
+        return None, {"id": file_id}
@@ -0,0 +1,251 @@
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, timedelta
+
+from gspread.utils import numericise_all
+
+from slots import TIME_SLOTS
+
+# In-memory stand-in for a gspread Spreadsheet, for benchmarks and offline
+# runs. Each request sleeps for `latency` seconds and counts against a
+# per-minute quota, mimicking the Sheets API's 429 responses.
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+def _column_index(letters):
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch.upper()) - 64
+    return col
+
+def _parse_a1(a1):
+    # "B5" -> (5, 2); "A2:F" -> ((2, 1), (None, 6)); missing parts are None.
+    a1 = a1.split("!")[-1]
+    parts = []
+    for part in a1.split(":"):
+        m = re.fullmatch(r"([A-Za-z]*)(\d*)", part)
+        parts.append((int(m.group(2)) if m.group(2) else None, _column_index(m.group(1)) if m.group(1) else None))
+    return parts
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, rows, sheet_id):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self._rows = [list(map(str, row)) for row in rows]
+
+    def _request(self, name):
+        self.spreadsheet._request(f"{self.title}.{name}")
+
+    @property
+    def row_count(self):
+        return len(self._rows)
+
+    def get_all_values(self):
+        self._request("get_all_values")
+        width = max((len(r) for r in self._rows), default=0)
+        return [r + [""] * (width - len(r)) for r in self._rows]
+
+    def get_all_records(self):
+        values = self.get_all_values()
+        if not values:
+            return []
+        return [dict(zip(values[0], numericise_all(row))) for row in values[1:]]
+
+    def _values(self, range_name=None):
+        # Like the API: blank rows inside the range are kept, trailing ones omitted.
+        if range_name is None:
+            rows = [list(r) for r in self._rows]
+        else:
+            (r1, c1), (r2, c2) = (_parse_a1(range_name) * 2)[:2]
+            rows = [r[(c1 or 1) - 1:c2] for r in self._rows[(r1 or 1) - 1:r2]]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return rows
+
+    def get_values(self, range_name=None):
+        self._request("get_values")
+        return self._values(range_name)
+
+    def row_values(self, row):
+        self._request("row_values")
+        return list(self._rows[row - 1]) if row <= len(self._rows) else []
+
+    def append_row(self, values, **kwargs):
+        self._request("append_row")
+        self._rows.append(["" if v is None else str(v) for v in values])
+
+    def append_rows(self, values, **kwargs):
+        self._request("append_rows")
+        self._rows.extend(["" if v is None else str(v) for v in row] for row in values)
+
+    def _set(self, row, col, value):
+        while len(self._rows) < row:
+            self._rows.append([])
+        cells = self._rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = "" if value is None else str(value)
+
+    def update_cell(self, row, col, value):
+        self._request("update_cell")
+        self._set(row, col, value)
+
+    def update(self, range_name="A1", values=None, **kwargs):
+        self._request("update")
+        (row, col), = _parse_a1(range_name)[:1]
+        for i, line in enumerate(values or []):
+            for j, value in enumerate(line):
+                self._set((row or 1) + i, (col or 1) + j, value)
+
+    def batch_update(self, data, **kwargs):
+        self._request("batch_update")
+        for item in data:
+            (row, col), = _parse_a1(item["range"])[:1]
+            for i, line in enumerate(item["values"]):
+                for j, value in enumerate(line):
+                    self._set(row + i, col + j, value)
+
+    def delete_rows(self, start_index, end_index=None):
+        self._request("delete_rows")
+        del self._rows[start_index - 1:end_index or start_index]
+
+    def clear(self):
+        self._request("clear")
+        self._rows = []
+
+
+class FakeSpreadsheet:
+    def __init__(self, sheets=None, latency=0.0, quota_per_minute=None):
+        # sheets: {title: [header row, data rows...]}
+        self.latency = latency
+        self.quota_per_minute = quota_per_minute
+        self.calls = Counter()
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self._sheets = {}
+        for title, rows in (sheets or {}).items():
+            self._add(title, rows)
+
+    def _add(self, title, rows):
+        ws = FakeWorksheet(self, title, rows, sheet_id=len(self._sheets) + 1)
+        self._sheets[title] = ws
+        return ws
+
+    def _request(self, name):
+        with self._lock:
+            now = time.monotonic()
+            if self.quota_per_minute is not None:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.quota_per_minute:
+                    raise FakeAPIError(429, "Quota exceeded for quota metric 'Read requests' (simulated)")
+                self._recent.append(now)
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def worksheet(self, title):
+        self._request("worksheet")
+        if title not in self._sheets:
+            raise FakeAPIError(404, f"Worksheet {title!r} not found")
+        return self._sheets[title]
+
+    def worksheets(self):
+        self._request("worksheets")
+        return list(self._sheets.values())
+
+    def add_worksheet(self, title, rows=1000, cols=26, **kwargs):
+        self._request("add_worksheet")
+        return self._add(title, [])
+
+    def values_batch_get(self, ranges, params=None):
+        self._request("values_batch_get")
+        value_ranges = []
+        for range_name in ranges:
+            title = range_name.split("!")[0].strip("'")
+            if title not in self._sheets:
+                raise FakeAPIError(400, f"Unable to parse range: {range_name}")
+            values = self._sheets[title]._values(range_name)
+            value_ranges.append({"range": range_name, "values": values} if values else {"range": range_name})
+        return {"valueRanges": value_ranges}
+
+    def batch_update(self, body):
+        self._request("batch_update")
+        by_id = {ws.id: ws for ws in self._sheets.values()}
+        # Validate first so a bad request leaves everything untouched, like the real API.
+        for request in body["requests"]:
+            target = (
+                request.get("appendCells") or request.get("deleteDimension", {}).get("range")
+                or request.get("updateCells", {}).get("start")
+            )
+            if target is None or target["sheetId"] not in by_id:
+                raise FakeAPIError(400, f"Unsupported request: {request}")
+        for request in body["requests"]:
+            if "appendCells" in request:
+                spec = request["appendCells"]
+                for row in spec["rows"]:
+                    by_id[spec["sheetId"]]._rows.append([
+                        str(next(iter(cell["userEnteredValue"].values()))) for cell in row["values"]
+                    ])
+            elif "updateCells" in request:
+                spec = request["updateCells"]
+                ws = by_id[spec["start"]["sheetId"]]
+                for i, row in enumerate(spec["rows"]):
+                    for j, cell in enumerate(row["values"]):
+                        ws._set(spec["start"]["rowIndex"] + i + 1, spec["start"]["columnIndex"] + j + 1,
+                                next(iter(cell["userEnteredValue"].values())))
+            else:
+                rng = request["deleteDimension"]["range"]
+                del by_id[rng["sheetId"]]._rows[rng["startIndex"]:rng["endIndex"]]
+        return {"replies": [{} for _ in body["requests"]]}
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+
+# Sample workbook for benchmark.py and the tests: n_appointments booked
+# from START on, a tenth as many customers, and 30 days of open slots after
+# the last booking. Returns ({title: rows}, n_customers).
+STATUSES = ["Pending Confirmation", "Confirmed", "Rescheduled", "Cancelled", "Completed"]
+START = date(2024, 1, 1)
+
+
+def build_sheets(n_appointments):
+    n_customers = max(10, n_appointments // 10)
+    days = max(30, n_appointments // len(TIME_SLOTS))
+    rng = random.Random(n_appointments)
+    users = [["Username", "Password", "Role", "Email"], ["pharmacist", "secret!123", "Pharmacist", "ph@example.com"]]
+    customers = [["customerID", "customerUsername", "customerPassword", "Full Name", "Email", "Phone Number", "Address"]]
+    for cid in range(1, n_customers + 1):
+        users.append([f"user{cid}", "secret!123", "Customer", f"user{cid}@example.com"])
+        customers.append([cid, f"user{cid}", "secret!123", f"Customer {cid}", f"user{cid}@example.com", "0123456789", ""])
+    appointments = [["appointmentID", "customerID", "Date", "Time", "Status", "appointmentReferralLetter"]]
+    for aid in range(1, n_appointments + 1):
+        day = START + timedelta(days=(aid - 1) // len(TIME_SLOTS))
+        appointments.append([aid, rng.randint(1, n_customers), str(day), TIME_SLOTS[(aid - 1) % len(TIME_SLOTS)], rng.choice(STATUSES), ""])
+    # Open slots for the next 30 days after the booked history
+    schedules = [["Date", "Time"]] + [
+        [str(START + timedelta(days=days + d)), t] for d in range(30) for t in TIME_SLOTS
+    ]
+    reports = [["reportID", "appointmentID", "reportDate", "reportContent"]] + [
+        [rid, rid * 3, str(START + timedelta(days=rid)), "Routine review, no issues."] for rid in range(1, n_appointments // 3)
+    ]
+    return {
+        "Users": users, "Customers": customers, "Appointments": appointments,
+        "Schedules": schedules, "Reports": reports, "Files": [["fileName", "filePath", "driveFileID"]],
+    }, n_customers
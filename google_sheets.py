@@ -1,142 +1,731 @@
-import gspread
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+import hashlib
 import json
-import streamlit as st
-import os
-import mimetypes
-from googleapiclient.http import MediaFileUpload
-
-
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-service_account_info = st.secrets["GOOGLE_SERVICE_ACCOUNT"]
-creds = Credentials.from_service_account_info(service_account_info, scopes=scope)
-client = gspread.authorize(creds)
-spreadsheet = client.open_by_key(st.secrets["SPREADSHEET_ID"])
-FOLDER_ID = st.secrets["FOLDER_ID"]
-
+import logging
+import re
+import threading
+import time
+from gspread.utils import numericise_all, rowcol_to_a1
+from archive import archivable, archive_month, archive_title, cutoff_date
+from config import get_setting
+from connection import get_spreadsheet, get_worksheet
+from drive_uploads import upload_file
+from id_allocator import next_id
+from instrumentation import instrument
+from events import publish
+from reservations import claim_slot, release_slot
+from slots import slot_key
+import request_context
+import write_queue
+
+
+# Process-wide worksheet snapshots shared by every Streamlit session.
+# Writers below keep them in step with the sheet, so reads only go back
+# to the API once an entry is older than CACHE_TTL seconds.
+CACHE_TTL = int(get_setting("CACHE_TTL", 60))
+_cache = {}
+_cache_lock = threading.RLock()
+_versions = {}  # sheet -> count of changes to its cache entry, see _load
+cache_stats = {"hits": 0, "misses": 0, "delta_refreshes": 0, "verify_failures": 0}
+log = logging.getLogger(__name__)
+
+# Append-heavy sheets are refreshed incrementally: only rows past the last
+# one we know are fetched. Every VERIFY_EVERY refreshes a window of
+# VERIFY_ROWS older rows is checksummed against the cache (walking through
+# the sheet over time) to catch edits made outside the app.
+DELTA_SHEETS = {"Appointments", "Reports", "Customers", "Files"}
+VERIFY_EVERY = int(get_setting("VERIFY_EVERY", 10))
+VERIFY_ROWS = int(get_setting("VERIFY_ROWS", 500))
+
+# With WRITE_QUEUE on, mutations update the cache and go to the durable
+# write_queue instead of the API, so they return at once and survive rate
+# limits and outages; "off" sends each one synchronously.
+QUEUE_WRITES = str(get_setting("WRITE_QUEUE", "on")).lower() == "on"
+
+
+def _fetch(sheet):
+    # Queued writes that haven't reached the sheet yet are replayed on top.
+    with write_queue.hold():
+        values = get_worksheet(sheet).get_all_values()
+        queued = write_queue.pending_writes(sheet)
+    headers = values[0] if values else []
+    records = [dict(zip(headers, numericise_all(row))) for row in values[1:]]
+    entry = {
+        "headers": headers, "records": records, "fetched_at": time.time(), "row_index": {},
+        "refreshes": 0, "verify_cursor": 0,
+    }
+    for write in queued:
+        _replay(sheet, entry, write)
+    return entry
+
+def _replay(sheet, entry, write):
+    records = entry["records"]
+    if "append" in write:
+        for row in write["append"]:
+            records.append(dict(zip(entry["headers"], numericise_all([str(v) for v in row]))))
+        return
+    key_col = ROW_KEYS[sheet]
+    key = _index_key(write.get("delete") or write["update"], key_col)
+    for i, record in enumerate(records):
+        if _index_key(record, key_col) == key:
+            if "delete" in write:
+                del records[i]
+            else:
+                record.update(write["changes"])
+            return
 
+def _column_range(entry, first_row, last_row=""):
+    last_col = rowcol_to_a1(1, max(1, len(entry["headers"]))).rstrip("0123456789")
+    return f"A{first_row}:{last_col}{last_row}"
+
+def _normalized(entry, values):
+    width = len(entry["headers"])
+    return numericise_all((list(values) + [""] * width)[:width])
+
+def _checksum(rows):
+    return hashlib.sha1(repr([list(row) for row in rows]).encode()).hexdigest()
+
+def _verify(sheet, entry):
+    records = entry["records"]
+    start = entry["verify_cursor"] if entry["verify_cursor"] < len(records) else 0
+    end = min(start + VERIFY_ROWS, len(records))
+    if start == end:
+        return True
+    fetched = get_worksheet(sheet).get_values(_column_range(entry, start + 2, end + 1))
+    fetched += [[]] * (end - start - len(fetched))  # trailing blank rows are omitted by the API
+    cached = [[r.get(h, "") for h in entry["headers"]] for r in records[start:end]]
+    entry["verify_cursor"] = end
+    return _checksum(_normalized(entry, row) for row in fetched) == _checksum(cached)
+
+def _delta_rows(sheet, entry):
+    # Rows appended to the sheet since `entry` was loaded, or None when the
+    # sheet no longer lines up with the cache and needs a full reload. The
+    # last known row is fetched along with the new ones, so deleted or
+    # inserted rows show up as a mismatch there.
+    last_row = len(entry["records"]) + 1
+    values = get_worksheet(sheet).get_values(_column_range(entry, last_row))
+    if not values:
+        return None
+    expected = entry["records"][-1] if entry["records"] else dict(zip(entry["headers"], numericise_all(entry["headers"])))
+    if _normalized(entry, values[0]) != [expected.get(h, "") for h in entry["headers"]]:
+        return None
+    if (entry["refreshes"] + 1) % VERIFY_EVERY == 0 and not _verify(sheet, entry):
+        with _cache_lock:
+            cache_stats["verify_failures"] += 1
+        return None
+    return values[1:]
+
+def _reload(sheet, entry):
+    # -> (entry, rows to append to it), or (a new entry, None)
+    if entry is not None and sheet in DELTA_SHEETS and entry["headers"]:
+        rows = _delta_rows(sheet, entry)
+        if rows is not None:
+            return entry, rows
+    return _fetch(sheet), None
+
+def _fresh(sheet, entry):
+    # A snapshot with queued writes already shows them and is kept until they land.
+    return time.time() - entry["fetched_at"] < CACHE_TTL or write_queue.pending(sheet)
+
+def _changed(sheet):
+    # Caller holds _cache_lock.
+    _versions[sheet] = _versions.get(sheet, 0) + 1
+
+def _load(sheet):
+    # The API calls run without _cache_lock, so a slow reload of one sheet
+    # doesn't stall every other read and write (writers ensure_fresh() before
+    # taking the lock for the same reason). If the cached sheet changed
+    # meanwhile, the result may miss that write and the reload is redone
+    # holding the lock.
+    with _cache_lock:
+        entry = _cache.get(sheet)
+        version = _versions.get(sheet, 0)
+    loaded, rows = _reload(sheet, entry)
+    with _cache_lock:
+        if _versions.get(sheet, 0) != version:
+            entry = _cache.get(sheet)
+            if entry is not None and _fresh(sheet, entry):
+                return entry  # reloaded by another thread, or has queued writes now
+            loaded, rows = _reload(sheet, entry)
+        if rows is not None:
+            for row in rows:
+                _cache_append(sheet, row)
+            loaded["fetched_at"] = time.time()
+            loaded["refreshes"] += 1
+            cache_stats["delta_refreshes"] += 1
+        else:
+            _cache[sheet] = loaded
+            publish(sheet, "reload")
+        _changed(sheet)
+        return loaded
+
+def _read(sheet):
+    with _cache_lock:
+        entry = _cache.get(sheet)
+        fresh = entry is not None and _fresh(sheet, entry)
+        if entry is not None and request_context.reuse(sheet, entry, expired=not fresh):
+            return entry
+        if fresh:
+            cache_stats["hits"] += 1
+            request_context.remember(sheet, entry)
+            return entry
+        cache_stats["misses"] += 1
+    entry = _load(sheet)
+    request_context.remember(sheet, entry)
+    return entry
+
+def _records(sheet):
+    # Callers are free to mutate what they get back (app.py does), so hand out copies.
+    entry = _read(sheet)
+    with _cache_lock:
+        return [dict(r) for r in entry["records"]]
+
+# Pseudo key column for indexing Schedules rows by their canonical SlotKey.
+SLOT_COLUMNS = ("Date", "Time")
+
+def _index_key(record, key_col):
+    if key_col == SLOT_COLUMNS:
+        return slot_key(record.get("Date"), record.get("Time"))
+    return str(record.get(key_col))
+
+def _entry_index(entry, key_col):
+    # key -> sheet row number (header is row 1), built once per snapshot.
+    index = entry["row_index"].get(key_col)
+    if index is None:
+        index = {_index_key(r, key_col): i for i, r in enumerate(entry["records"], start=2)}
+        entry["row_index"][key_col] = index
+    return index
+
+def ensure_fresh(*sheets):
+    # Reload any expired snapshot without copying records out.
+    for sheet in sheets:
+        _read(sheet)
+
+def _row_index(sheet, key_col):
+    entry = _read(sheet)
+    with _cache_lock:
+        return _entry_index(entry, key_col)
+
+def _cache_append(sheet, row):
+    with _cache_lock:
+        _changed(sheet)
+        entry = _cache.get(sheet)
+        if entry is None or not entry["headers"]:
+            _cache.pop(sheet, None)
+            publish(sheet, "reload")
+            return
+        values = numericise_all(["" if v is None else str(v) for v in row])
+        record = dict(zip(entry["headers"], values))
+        entry["records"].append(record)
+        row_number = len(entry["records"]) + 1
+        for key_col, index in entry["row_index"].items():
+            index[_index_key(record, key_col)] = row_number
+        publish(sheet, "append", dict(record))
+
+def _cache_update(sheet, key_col, key, changes):
+    with _cache_lock:
+        _changed(sheet)
+        entry = _cache.get(sheet)
+        if entry is None:
+            return
+        row_number = _entry_index(entry, key_col).get(str(key))
+        if row_number is not None:
+            record = entry["records"][row_number - 2]
+            previous = dict(record)
+            record.update(changes)
+            publish(sheet, "update", dict(record), previous)
+
+def _cache_delete(sheet, index):
+    with _cache_lock:
+        _changed(sheet)
+        entry = _cache.get(sheet)
+        if entry is not None and index < len(entry["records"]):
+            record = entry["records"].pop(index)
+            deleted_row = index + 2
+            # Rows below the deleted one move up by one; patch the indexes in place.
+            for key_col, rows in entry["row_index"].items():
+                if rows.get(_index_key(record, key_col)) == deleted_row:
+                    del rows[_index_key(record, key_col)]
+                for key, row_number in rows.items():
+                    if row_number > deleted_row:
+                        rows[key] = row_number - 1
+            publish(sheet, "delete", record)
+
+def _cache_delete_many(sheet, indexes):
+    with _cache_lock:
+        _changed(sheet)
+        entry = _cache.get(sheet)
+        if entry is None:
+            return
+        for index in sorted(set(indexes), reverse=True):
+            if index < len(entry["records"]):
+                publish(sheet, "delete", entry["records"].pop(index))
+        # Cheaper to rebuild lazily once than to shift every index per row.
+        entry["row_index"].clear()
+
+def _cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": "" if value is None else str(value)}}
+
+# Every mutation is a list of (sheet, write) pairs. Writes name rows by key,
+# not position:
+#   {"append": [row, ...]}
+#   {"update": match, "changes": {column: value}}
+#   {"delete": match}
+# where match holds the row's ROW_KEYS columns, which lead each sheet. Row
+# numbers are looked up when the writes are sent, so a queued write still
+# hits the right row after earlier writes were dropped or another worker
+# changed the sheet, and a retried delete can't remove a second row.
+ROW_KEYS = {"Schedules": SLOT_COLUMNS, "Appointments": "appointmentID", "Reports": "reportID", "Customers": "customerID"}
+
+def _plain(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return "" if value is None else str(value)
+
+def _key_columns(sheet):
+    key_col = ROW_KEYS[sheet]
+    return key_col if isinstance(key_col, tuple) else (key_col,)
+
+def _match(sheet, record):
+    return {col: _plain(record.get(col)) for col in _key_columns(sheet)}
+
+def _append_write(sheet, rows):
+    return (sheet, {"append": [[_plain(v) for v in row] for row in rows]})
+
+def _update_write(sheet, record, changes):
+    return (sheet, {"update": _match(sheet, record), "changes": {col: _plain(v) for col, v in changes.items()}})
+
+def _delete_writes(sheet, records):
+    return [(sheet, {"delete": _match(sheet, record)}) for record in records]
+
+def _layouts(sheets):
+    # Header row and row keys (in row order) of each sheet, in one request.
+    if not sheets:
+        return {}
+    ranges = []
+    for sheet in sheets:
+        last_col = rowcol_to_a1(1, len(_key_columns(sheet))).rstrip("0123456789")
+        ranges += [f"'{sheet}'!1:1", f"'{sheet}'!A2:{last_col}"]
+    value_ranges = get_spreadsheet().values_batch_get(ranges)["valueRanges"]
+    layouts = {}
+    for i, sheet in enumerate(sheets):
+        headers = (value_ranges[2 * i].get("values") or [[]])[0]
+        columns = _key_columns(sheet)
+        if tuple(headers[:len(columns)]) != columns:
+            raise ValueError(f"{sheet} must start with its key columns {columns}, found {headers[:len(columns)]}")
+        rows = value_ranges[2 * i + 1].get("values", [])
+        layouts[sheet] = {"headers": headers, "keys": [_index_key(dict(zip(columns, row)), ROW_KEYS[sheet]) for row in rows]}
+    return layouts
+
+def _apply_writes(writes):
+    # One batch_update; consecutive appends to a sheet and deletes of adjacent
+    # rows are merged. Returns the updates and deletes that were skipped
+    # because their row no longer exists.
+    layouts = _layouts(sorted({sheet for sheet, write in writes if "append" not in write}))
+    requests, skipped = [], []
+    for sheet, write in writes:
+        sheet_id = get_worksheet(sheet).id
+        last = requests[-1] if requests else {}
+        if "append" in write:
+            rows = [{"values": [_cell(v) for v in row]} for row in write["append"]]
+            if "appendCells" in last and last["appendCells"]["sheetId"] == sheet_id:
+                last["appendCells"]["rows"] += rows
+            else:
+                requests.append({"appendCells": {"sheetId": sheet_id, "rows": rows, "fields": "userEnteredValue"}})
+            if sheet in layouts:
+                layout = layouts[sheet]
+                layout["keys"] += [_index_key(dict(zip(layout["headers"], row)), ROW_KEYS[sheet]) for row in write["append"]]
+            continue
+
+        layout = layouts[sheet]
+        try:
+            index = layout["keys"].index(_index_key(write.get("delete") or write["update"], ROW_KEYS[sheet])) + 1
+        except ValueError:
+            skipped.append((sheet, write))
+            continue
+        if "update" in write:
+            for col, value in write["changes"].items():
+                requests.append({"updateCells": {
+                    "rows": [{"values": [_cell(value)]}],
+                    "fields": "userEnteredValue",
+                    "start": {"sheetId": sheet_id, "rowIndex": index, "columnIndex": layout["headers"].index(col)},
+                }})
+            continue
+        del layout["keys"][index - 1]
+        rng = last.get("deleteDimension", {}).get("range")
+        if rng and rng["sheetId"] == sheet_id and index == rng["startIndex"]:
+            rng["endIndex"] += 1  # the row below the last range, moved up into its place
+        elif rng and rng["sheetId"] == sheet_id and index == rng["startIndex"] - 1:
+            rng["startIndex"] -= 1
+        else:
+            requests.append({"deleteDimension": {"range": {
+                "sheetId": sheet_id, "dimension": "ROWS", "startIndex": index, "endIndex": index + 1,
+            }}})
+    if requests:
+        get_spreadsheet().batch_update({"requests": requests})
+    return skipped
+
+def _submit(writes):
+    # Callers hold _cache_lock and update the cache right after, so the
+    # queued writes replayed by _fetch always match the cached sheet.
+    if QUEUE_WRITES or write_queue.pending():
+        write_queue.enqueue(writes)
+    else:
+        _writes_dropped(_apply_writes(writes))
+
+def _writes_dropped(writes):
+    # The cache assumed these writes landed; reload the sheets they touched,
+    # and give back the slots of bookings and reschedules that never happened.
+    for sheet, write in writes:
+        if sheet == "Schedules" and "delete" in write:
+            release_slot(slot_key(write["delete"]["Date"], write["delete"]["Time"]))
+    for sheet in {sheet for sheet, _ in writes}:
+        invalidate_cache(sheet)
+
+def _append_rows(sheet, rows):
+    with _cache_lock:
+        _submit([_append_write(sheet, rows)])
+        for row in rows:
+            _cache_append(sheet, row)
+
+@instrument
+def append_row(sheet, row):
+    _append_rows(sheet, [row])
+
+@instrument
+def get_records(sheet):
+    return _records(sheet)
+
+@instrument
+def invalidate_cache(sheet=None):
+    with _cache_lock:
+        for name in ([sheet] if sheet else list(_cache)):
+            _cache.pop(name, None)
+            _changed(name)
+            publish(name, "reload")
+        if sheet is None:
+            _archive_titles["titles"] = None
+
+def get_cache_stats():
+    with _cache_lock:
+        stats = dict(cache_stats)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / total if total else 0.0
+        stats["sheets"] = {
+            name: {"rows": len(entry["records"]), "age": time.time() - entry["fetched_at"]}
+            for name, entry in _cache.items()
+        }
+        stats["request_context"] = request_context.get_stats()
+        stats["pending_writes"] = write_queue.pending()
+        stats["write_queue"] = dict(write_queue.stats)
+        return stats
+
+
+def _max_id(sheet, col_name):
+    # Archived rows keep their IDs, so they count too.
+    ids = [int(r[col_name]) for r in _read(sheet)["records"] if str(r.get(col_name, "")).strip().isdigit()]
+    for title in _archived_sheets(sheet).values():
+        ids += [int(r[col_name]) for r in _read(title)["records"] if str(r.get(col_name, "")).strip().isdigit()]
+    return max(ids, default=0)
+
+@instrument
 def generate_next_id(sheet, col_name):
-    records = spreadsheet.worksheet(sheet).get_all_records()
-    if not records: return 1
-    return int(records[-1][col_name]) + 1
+    # The sheet is only read once per sequence, to seed it from the current max ID.
+    return next_id(sheet, lambda: _max_id(sheet, col_name))
 
+@instrument
 def save_customer(data):
-    ws = spreadsheet.worksheet("Customers")
     cid = generate_next_id("Customers", "customerID")
-    ws.append_row([cid] + data)
+    _append_rows("Customers", [[cid] + data])
     return cid
 
+@instrument
 def save_appointment(data, referral_path=None):
-    worksheet = spreadsheet.worksheet("Appointments")
-    appointment_id = generate_next_id("Appointments", "appointmentID")
+    # Claims the slot, then appends the appointment and deletes the schedule
+    # row in one atomic spreadsheet batch_update. Returns None if another
+    # session already took the slot.
+    key = slot_key(data[1], data[2])  # data[1] = date, data[2] = time
+    ensure_fresh("Schedules")
+    if not claim_slot(key):
+        return None
     if referral_path is None:
         referral_path = ""
-    worksheet.append_row([appointment_id] + data + [referral_path])  # Add referral path to appointment
-    remove_schedule_slot(data[1], data[2])  # data[1] = date, data[2] = time
-
-
-
 
+    with _cache_lock:
+        try:
+            schedules = _read("Schedules")
+            slot_row = _entry_index(schedules, SLOT_COLUMNS).get(key)
+            if slot_row is None:
+                release_slot(key)
+                log.info("Slot no longer available: %s - %s", data[1], data[2])
+                return None
+            slot = schedules["records"][slot_row - 2]
+            appointment_id = generate_next_id("Appointments", "appointmentID")
+            row = [appointment_id] + data + [referral_path]  # Add referral path to appointment
+            _submit([_append_write("Appointments", [row])] + _delete_writes("Schedules", [slot]))
+        except Exception:
+            # Nothing was written; don't leave the slot unbookable for CLAIM_TTL.
+            release_slot(key)
+            raise
+        _cache_append("Appointments", row)
+        _cache_delete("Schedules", slot_row - 2)
+    return appointment_id
+
+
+
+
+@instrument
 def save_file_metadata(data):
-    ws = spreadsheet.worksheet("Files")
-    ws.append_row(data)
+    _append_rows("Files", [data])
+
+@instrument
+def find_file(file_path):
+    # Drive file ID already recorded for file_path, or None.
+    entry = _read("Files")
+    with _cache_lock:
+        row_number = _entry_index(entry, "filePath").get(str(file_path))
+        return None if row_number is None else entry["records"][row_number - 2].get("driveFileID")
 
 
 
+@instrument
 def get_appointments():
-    ws = spreadsheet.worksheet("Appointments")
-    return ws.get_all_records()
+    return _records("Appointments")
 
+@instrument
 def update_schedule(date, time):
-    ws = spreadsheet.worksheet("Schedules")
-    ws.append_row([date, time])
+    _append_rows("Schedules", [[date, time]])
+    release_slot(slot_key(date, time))
 
+@instrument
 def get_pharmacist_schedule():
-    return spreadsheet.worksheet("Schedules").get_all_records()
+    return _records("Schedules")
 
+@instrument
 def update_appointment_status(appointment_id, new_status=None, new_date=None, new_time=None):
-    import gspread
-    from google.oauth2 import service_account
-    import streamlit as st
-
-    creds = service_account.Credentials.from_service_account_info(st.secrets["GOOGLE_SERVICE_ACCOUNT"])
-    client = gspread.authorize(creds)
-    sheet = client.open_by_key(st.secrets["SPREADSHEET_ID"]).worksheet("Appointments")
-
-    headers = sheet.row_values(1)
-    records = sheet.get_all_records()
-
-    for idx, row in enumerate(records):
-        if str(row["appointmentID"]) == str(appointment_id):
-            row_number = idx + 2  # Account for header row
-
-            if new_status:
-                col_index = headers.index("Status") + 1
-                sheet.update_cell(row_number, col_index, new_status)
-
-            if new_date:
-                col_index = headers.index("Date") + 1
-                sheet.update_cell(row_number, col_index, new_date)
-
-            if new_time:
-                col_index = headers.index("Time") + 1
-                sheet.update_cell(row_number, col_index, new_time)
-
-            break
-
-
-
-
+    return update_appointments([{
+        "appointment_id": appointment_id,
+        "new_status": new_status,
+        "new_date": new_date,
+        "new_time": new_time,
+    }]) == 1
+
+@instrument
+def update_appointments(updates):
+    # Every changed cell across all updates goes out in a single batch_update.
+    # A new date/time books its slot the way save_appointment does: the slot
+    # is claimed and its Schedules row deleted in the same batch, so an update
+    # whose slot is gone or taken is skipped.
+    fields = (("new_status", "Status"), ("new_date", "Date"), ("new_time", "Time"))
+    ensure_fresh("Appointments", *(["Schedules"] if any(u.get("new_date") or u.get("new_time") for u in updates) else []))
+    with _cache_lock:
+        appointments = _read("Appointments")
+        rows = _entry_index(appointments, "appointmentID")
+        schedules = None
+        writes, applied, claimed, slot_rows = [], [], [], []
+        try:
+            for update in updates:
+                row_number = rows.get(str(update["appointment_id"]))
+                if row_number is None:
+                    log.warning("Appointment not found for update: %s", update["appointment_id"])
+                    continue
+                changes = {col: update[key] for key, col in fields if update.get(key)}
+                record = appointments["records"][row_number - 2]
+                date, time = changes.get("Date", record["Date"]), changes.get("Time", record["Time"])
+                key = slot_key(date, time)
+                if key != slot_key(record["Date"], record["Time"]):
+                    if not claim_slot(key):
+                        log.info("Slot no longer available: %s - %s", date, time)
+                        continue
+                    schedules = schedules or _read("Schedules")
+                    slot_row = _entry_index(schedules, SLOT_COLUMNS).get(key)
+                    if slot_row is None:
+                        release_slot(key)
+                        log.info("Slot no longer available: %s - %s", date, time)
+                        continue
+                    claimed.append(key)
+                    slot_rows.append(slot_row)
+                if changes:
+                    writes.append(_update_write("Appointments", record, changes))
+                applied.append((update["appointment_id"], changes))
+
+            if writes:
+                slots = [schedules["records"][row - 2] for row in slot_rows]
+                _submit(writes + _delete_writes("Schedules", slots))
+        except Exception:
+            for key in claimed:
+                release_slot(key)
+            raise
+        for appointment_id, changes in applied:
+            _cache_update("Appointments", "appointmentID", appointment_id, changes)
+        _cache_delete_many("Schedules", [row - 2 for row in slot_rows])
+        return len(applied)
+
+
+
+
+@instrument
 def get_all_customers():
-    return spreadsheet.worksheet("Customers").get_all_records()
+    return _records("Customers")
 
+@instrument
 def save_report(data):
-    ws = spreadsheet.worksheet("Reports")
     rid = generate_next_id("Reports", "reportID")
-    ws.append_row([rid] + data)
+    _append_rows("Reports", [[rid] + data])
 
+@instrument
 def remove_schedule_slot(date, time):
-    worksheet = spreadsheet.worksheet("Schedules")
-    records = worksheet.get_all_records()
-    date = str(date).strip().lower()
-    time = str(time).strip().lower()
-
-    for idx, record in enumerate(records, start=2):
-        rec_date = str(record["Date"]).strip().lower()
-        rec_time = str(record["Time"]).strip().lower()
-        if rec_date == date and rec_time == time:
-            worksheet.delete_rows(idx)
+    key = slot_key(date, time)
+
+    # Hold the cache lock so the row number can't shift under another session's delete.
+    ensure_fresh("Schedules")
+    with _cache_lock:
+        schedules = _read("Schedules")
+        row_number = _entry_index(schedules, SLOT_COLUMNS).get(key)
+        if row_number is not None:
+            _submit(_delete_writes("Schedules", [schedules["records"][row_number - 2]]))
+            _cache_delete("Schedules", row_number - 2)
             return
-    print(f"[DEBUG] Slot not found for deletion: {date} - {time}")
-
+    log.warning("Slot not found for deletion: %s - %s", date, time)
+
+@instrument
+def add_schedule_slots(slots):
+    # slots: iterable of (date, time). Existing and repeated slots are skipped;
+    # everything new goes out in one append_rows call.
+    ensure_fresh("Schedules")
+    with _cache_lock:
+        existing = _row_index("Schedules", SLOT_COLUMNS)
+        new_rows, seen = [], set()
+        for date, time in slots:
+            key = slot_key(date, time)
+            if key in existing or key in seen:
+                continue
+            seen.add(key)
+            new_rows.append([str(date), time])
+        if new_rows:
+            _append_rows("Schedules", new_rows)
+            for row in new_rows:
+                release_slot(slot_key(*row))
+        return len(new_rows)
+
+@instrument
+def remove_schedule_slots(slots):
+    # All slots go out in a single spreadsheet batch_update; _apply_writes
+    # merges adjacent rows into ranges.
+    ensure_fresh("Schedules")
+    with _cache_lock:
+        schedules = _read("Schedules")
+        index = _entry_index(schedules, SLOT_COLUMNS)
+        rows = sorted({index[k] for k in (slot_key(d, t) for d, t in slots) if k in index})
+        if not rows:
+            return 0
+        _submit(_delete_writes("Schedules", [schedules["records"][row - 2] for row in rows]))
+        _cache_delete_many("Schedules", [row - 2 for row in rows])
+        return len(rows)
+
+# Archive partitions: one worksheet per sheet and month, see archive.py.
+_archive_titles = {"titles": None, "fetched_at": 0.0}
+
+def _archived_sheets(sheet):
+    # month -> worksheet title of every archive partition of `sheet`
+    with _cache_lock:
+        if _archive_titles["titles"] is None or time.time() - _archive_titles["fetched_at"] >= CACHE_TTL:
+            _archive_titles["titles"] = [ws.title for ws in get_spreadsheet().worksheets()]
+            _archive_titles["fetched_at"] = time.time()
+        pattern = re.compile(re.escape(archive_title(sheet, "")) + r"(\d{4}-\d{2})")
+        return {m.group(1): m.group(0) for m in map(pattern.fullmatch, _archive_titles["titles"]) if m}
+
+def _archive_rows(sheet, month, headers, records, key_col):
+    # Rows already in the partition (from an earlier run that failed before
+    # deleting them from the hot sheet) are skipped.
+    title = archive_title(sheet, month)
+    if month in _archived_sheets(sheet):
+        existing = _entry_index(_read(title), key_col)
+        rows = [[r.get(h, "") for h in headers] for r in records if str(r.get(key_col)) not in existing]
+    else:
+        get_spreadsheet().add_worksheet(title=title, rows=len(records) + 1, cols=len(headers))
+        _archive_titles["titles"].append(title)
+        rows = [list(headers)] + [[r.get(h, "") for h in headers] for r in records]
+    if rows:
+        get_worksheet(title).append_rows(rows)
+    _cache.pop(title, None)
+    _changed(title)
+
+@instrument
+def archive_appointments(older_than_days=None, today=None):
+    # Copies to the archive first and deletes from the hot sheets last, in one
+    # batch of writes, so a failure in between can't lose rows.
+    cutoff = cutoff_date(older_than_days, today)
+    ensure_fresh("Appointments", "Reports")
+    with _cache_lock:
+        appointments = _read("Appointments")
+        moving = {i: archive_month(r) for i, r in enumerate(appointments["records"]) if archivable(r, cutoff)}
+        if not moving:
+            return 0
+        months = {str(appointments["records"][i]["appointmentID"]): month for i, month in moving.items()}
+        reports = _read("Reports")
+        linked = {
+            i: months[str(r.get("appointmentID"))]
+            for i, r in enumerate(reports["records"]) if str(r.get("appointmentID")) in months
+        }
+
+        writes = []
+        for sheet, entry, key_col, picked in (
+            ("Appointments", appointments, "appointmentID", moving),
+            ("Reports", reports, "reportID", linked),
+        ):
+            by_month = {}
+            for i, month in picked.items():
+                by_month.setdefault(month, []).append(entry["records"][i])
+            for month, records in sorted(by_month.items()):
+                _archive_rows(sheet, month, entry["headers"], records, key_col)
+            if picked:
+                writes += _delete_writes(sheet, [entry["records"][i] for i in picked])
+        _submit(writes)
+        _cache_delete_many("Appointments", list(moving))
+        _cache_delete_many("Reports", list(linked))
+        return len(moving)
+
+def _archived_records(sheet, month, key_col, value):
+    titles = _archived_sheets(sheet)
+    records = []
+    for m in ([month] if month else sorted(titles)):
+        if m in titles:
+            entry = _read(titles[m])
+            with _cache_lock:
+                records += [dict(r) for r in entry["records"] if value is None or str(r.get(key_col)) == str(value)]
+    return records
+
+@instrument
+def get_archived_months():
+    return sorted(_archived_sheets("Appointments"))
+
+@instrument
+def get_archived_appointments(month=None, customer_id=None):
+    return _archived_records("Appointments", month, "customerID", customer_id)
+
+@instrument
+def get_archived_reports(month=None, appointment_id=None):
+    return _archived_records("Reports", month, "appointmentID", appointment_id)
+
+@instrument
 def upload_to_drive(file_path):
-    drive_service = build("drive", "v3", credentials=creds)
-    file_metadata = {
-        "name": os.path.basename(file_path),
-        "parents": [FOLDER_ID]
-    }
-    mimetype, _ = mimetypes.guess_type(file_path)
-    media = MediaFileUpload(file_path, mimetype=mimetype)
-    uploaded_file = drive_service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields="id"
-    ).execute()
-    return uploaded_file.get("id")
+    return upload_file(file_path)
 
 
+@instrument
 def restore_schedule_slot(date, time):
-    worksheet = spreadsheet.worksheet("Schedules")
-    records = worksheet.get_all_records()
-    for record in records:
-        rec_date = str(record["Date"]).strip().lower()
-        rec_time = str(record["Time"]).strip().lower()
-        if rec_date == str(date).strip().lower() and rec_time == str(time).strip().lower():
+    ensure_fresh("Schedules")
+    with _cache_lock:
+        if slot_key(date, time) in _row_index("Schedules", SLOT_COLUMNS):
             return  # already exists
-    worksheet.append_row([date, time])
+        _append_rows("Schedules", [[date, time]])
+        release_slot(slot_key(date, time))
 
+@instrument
 def get_all_reports():
-    ws = spreadsheet.worksheet("Reports")
-    return ws.get_all_records()
+    return _records("Reports")
+
 
+write_queue.set_applier(_apply_writes, _writes_dropped)
@@ -0,0 +1,59 @@
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; the thread lock still covers a single worker
+    fcntl = None
+
+# Sequences live in a small local JSON file so IDs survive restarts and stay
+# unique across Streamlit worker processes sharing the same disk.
+SEQUENCE_FILE = os.environ.get("ID_SEQUENCE_FILE", "id_sequences.json")
+_lock = threading.Lock()
+
+
+def next_id(name, bootstrap):
+    # bootstrap() is only called the first time a sequence is seen and must
+    # return the highest ID already in use.
+    with _lock:
+        fd = os.open(SEQUENCE_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                raw = f.read()
+                sequences = json.loads(raw) if raw.strip() else {}
+                if name not in sequences:
+                    sequences[name] = int(bootstrap())
+                sequences[name] += 1
+                f.seek(0)
+                f.truncate()
+                json.dump(sequences, f)
+                f.flush()
+                os.fsync(f.fileno())
+                return sequences[name]
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+def reset_sequence(name=None):
+    with _lock:
+        if not os.path.exists(SEQUENCE_FILE):
+            return
+        if name is None:
+            os.remove(SEQUENCE_FILE)
+            return
+        with open(SEQUENCE_FILE, "r+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                raw = f.read()
+                sequences = json.loads(raw) if raw.strip() else {}
+                sequences.pop(name, None)
+                f.seek(0)
+                f.truncate()
+                json.dump(sequences, f)
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,142 @@
+import contextlib
+import csv
+import functools
+import io
+import json
+import threading
+import time
+from collections import deque
+
+# Call counts, wall time and rows moved for every data-layer function
+# ("function") and every underlying gspread request ("api"), broken down by
+# the app.py page that triggered them. Work done outside a page run (e.g.
+# background uploads) is attributed to "background".
+RECENT_RUNS = 200
+
+_stats = {}
+_runs = deque(maxlen=RECENT_RUNS)
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def start_rerun(page):
+    # Called at the top of every Streamlit script run.
+    run = {
+        "page": page, "started": time.time(), "api_calls": 0, "api_time": 0.0, "api_rows": 0, "function_calls": 0,
+        "reads": 0, "duplicate_reads": 0, "fetches_saved": 0,
+    }
+    _local.page = page
+    _local.run = run
+    with _lock:
+        _runs.append(run)
+    return run
+
+def current_page():
+    return getattr(_local, "page", "background")
+
+def current_run():
+    return getattr(_local, "run", None)
+
+@contextlib.contextmanager
+def attributed_to(page):
+    # Charge this thread's calls to `page`, e.g. queued writes flushed on its behalf.
+    previous = current_page()
+    _local.page = page
+    try:
+        yield
+    finally:
+        _local.page = previous
+
+def record(kind, name, elapsed, rows=0):
+    page = current_page()
+    run = getattr(_local, "run", None)
+    with _lock:
+        entry = _stats.setdefault((kind, name, page), {"calls": 0, "time": 0.0, "rows": 0, "max_time": 0.0})
+        entry["calls"] += 1
+        entry["time"] += elapsed
+        entry["rows"] += rows
+        entry["max_time"] = max(entry["max_time"], elapsed)
+        if run is not None:
+            if kind == "api":
+                run["api_calls"] += 1
+                run["api_time"] += elapsed
+                run["api_rows"] += rows
+            else:
+                run["function_calls"] += 1
+
+def _count_rows(result):
+    return len(result) if isinstance(result, list) else 0
+
+def instrument(fn):
+    name = f"{fn.__module__}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = None
+        try:
+            result = fn(*args, **kwargs)
+            return result
+        finally:
+            record("function", name, time.perf_counter() - start, _count_rows(result))
+    return wrapper
+
+
+# Rows sent or received by each gspread call we make, from its arguments/result.
+_API_ROWS = {
+    "append_row": lambda args, kwargs, result: 1,
+    "append_rows": lambda args, kwargs, result: len(args[0]) if args else len(kwargs.get("values", [])),
+    "update_cell": lambda args, kwargs, result: 1,
+    "batch_update": lambda args, kwargs, result: len(args[0].get("requests", [])) if args and isinstance(args[0], dict) else len(args[0]) if args else 0,
+    "delete_rows": lambda args, kwargs, result: (args[1] - args[0] + 1) if len(args) > 1 else 1,
+}
+
+
+class InstrumentedProxy:
+    # Wraps a gspread Worksheet or Spreadsheet and times every method call.
+    def __init__(self, target, label):
+        self._target = target
+        self._label = label
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if not callable(value):
+            return value
+        name = f"{self._label}.{attr}"
+        count = _API_ROWS.get(attr, lambda args, kwargs, result: _count_rows(result))
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            result = None
+            try:
+                result = value(*args, **kwargs)
+                return result
+            finally:
+                record("api", name, time.perf_counter() - start, count(args, kwargs, result))
+        return call
+
+
+def snapshot():
+    with _lock:
+        rows = [
+            {"kind": kind, "name": name, "page": page, **entry}
+            for (kind, name, page), entry in sorted(_stats.items())
+        ]
+        runs = [dict(run) for run in _runs]
+    return {"calls": rows, "recent_runs": runs}
+
+def export_json():
+    return json.dumps(snapshot(), indent=2)
+
+def export_csv():
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=["kind", "name", "page", "calls", "time", "max_time", "rows"])
+    writer.writeheader()
+    writer.writerows(snapshot()["calls"])
+    return out.getvalue()
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _runs.clear()
@@ -0,0 +1,45 @@
+import importlib
+import sys
+import time
+
+import gspread
+import streamlit as st
+from google.oauth2.service_account import Credentials
+
+# Compares what a cold Streamlit worker pays before rendering anything.
+#   before: google_sheets.py and auth.py each authorised gspread and opened
+#           the spreadsheet at import time
+#   after:  importing the modules is free; the shared connection is opened
+#           on the first worksheet access
+#
+#   python measure_startup.py
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def eager_startup():
+    from connection import scope
+    for _ in range(2):
+        creds = Credentials.from_service_account_info(st.secrets["GOOGLE_SERVICE_ACCOUNT"], scopes=scope)
+        gspread.authorize(creds).open_by_key(st.secrets["SPREADSHEET_ID"])
+
+def lazy_import():
+    for name in ("connection", "google_sheets", "auth", "storage"):
+        sys.modules.pop(name, None)
+        importlib.import_module(name)
+
+def first_access():
+    from connection import get_worksheet
+    get_worksheet("Users")
+
+
+if __name__ == "__main__":
+    before = _timed(eager_startup)
+    after_import = _timed(lazy_import)
+    after_first = _timed(first_access)
+    print(f"before: import-time connection setup  {before * 1000:8.1f} ms")
+    print(f"after:  module import                 {after_import * 1000:8.1f} ms")
+    print(f"after:  first worksheet access        {after_first * 1000:8.1f} ms (paid once per process, on demand)")
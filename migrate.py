@@ -0,0 +1,47 @@
+import argparse
+
+import id_allocator
+import sqlite_backend
+from config import write_queue_off
+
+# Copies every table between the Google Sheets spreadsheet and the local
+# SQLite database, replacing the destination's contents.
+#
+#   python migrate.py sheets-to-sqlite
+#   python migrate.py sqlite-to-sheets --tables Schedules Appointments
+
+
+def sheets_to_sqlite(tables):
+    from connection import get_worksheet
+    for table in tables:
+        values = get_worksheet(table).get_all_values()
+        headers, rows = (values[0], values[1:]) if values else (sqlite_backend.TABLES[table], [])
+        count = sqlite_backend.import_table(table, headers, rows)
+        print(f"{table}: {count} rows -> {sqlite_backend.DB_PATH}")
+
+def sqlite_to_sheets(tables):
+    from connection import get_worksheet
+    from google_sheets import invalidate_cache
+    import write_queue
+    write_queue.flush()  # queued writes refer to the sheets we're about to replace
+    for table in tables:
+        headers, rows = sqlite_backend.export_table(table)
+        ws = get_worksheet(table)
+        ws.clear()
+        ws.update(range_name="A1", values=[headers] + rows)
+        invalidate_cache(table)
+        # IDs in the sheet may have changed; reseed the allocator from the new max.
+        id_allocator.reset_sequence(table)
+        print(f"{table}: {len(rows)} rows -> spreadsheet")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy data between the Sheets and SQLite backends.")
+    parser.add_argument("direction", choices=["sheets-to-sqlite", "sqlite-to-sheets"])
+    parser.add_argument("--tables", nargs="+", default=list(sqlite_backend.TABLES), choices=list(sqlite_backend.TABLES))
+    args = parser.parse_args()
+    write_queue_off()
+    if args.direction == "sheets-to-sqlite":
+        sheets_to_sqlite(args.tables)
+    else:
+        sqlite_to_sheets(args.tables)
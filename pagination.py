@@ -0,0 +1,13 @@
+import math
+
+
+def count_pages(total, page_size):
+    return max(1, math.ceil(total / page_size))
+
+def paginate(items, page, page_size):
+    # Returns (items on the page, the page actually shown, total pages); out of
+    # range page numbers are clamped so a shrinking list never shows an empty page.
+    page_count = count_pages(len(items), page_size)
+    page = min(max(1, int(page)), page_count)
+    start = (page - 1) * page_size
+    return items[start:start + page_size], page, page_count
@@ -0,0 +1,9 @@
+import re
+
+# Password rules for registration. Kept apart from auth.py, which is the
+# Sheets-backed user directory, so the app can check passwords without
+# loading a storage backend.
+
+
+def check_password_complexity(password):
+    return len(password) >= 8 and re.search(r"[!@#$%^&*(),.?\":{}|<>]", password)
@@ -0,0 +1,138 @@
+import bisect
+import re
+
+from events import DerivedIndex
+from pagination import paginate
+from slots import parse_date
+from storage import ensure_fresh, get_all_reports, get_appointments
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text):
+    return set(_WORD.findall(str(text).lower()))
+
+def _sort_key(report):
+    rid = str(report["reportID"])
+    return (str(parse_date(report.get("reportDate")) or report.get("reportDate", "")), int(rid) if rid.isdigit() else 0, rid)
+
+def _build(reports, appointments):
+    index = {
+        "reports": {}, "customers": {}, "by_customer": {}, "by_appointment": {},
+        "terms": {}, "vocabulary": None, "order": None, "options": None,
+    }
+    for appt in appointments:
+        index["customers"][str(appt["appointmentID"])] = str(appt["customerID"])
+    for report in reports:
+        _add(index, report)
+    return index
+
+def _dirty(index):
+    index["order"] = None
+    index["options"] = None
+
+def _add(index, report):
+    rid = str(report["reportID"])
+    aid = str(report["appointmentID"])
+    joined = dict(report, customerID=index["customers"].get(aid, "Unknown"))
+    index["reports"][rid] = joined
+    index["by_customer"].setdefault(joined["customerID"], set()).add(rid)
+    index["by_appointment"].setdefault(aid, set()).add(rid)
+    for word in _words(report.get("reportContent", "")):
+        if word not in index["terms"]:
+            index["vocabulary"] = None
+        index["terms"].setdefault(word, set()).add(rid)
+    _dirty(index)
+
+def _remove(index, report):
+    joined = index["reports"].pop(str(report["reportID"]), None)
+    if joined is None:
+        return
+    rid = str(joined["reportID"])
+    index["by_customer"].get(joined["customerID"], set()).discard(rid)
+    index["by_appointment"].get(str(joined["appointmentID"]), set()).discard(rid)
+    for word in _words(joined.get("reportContent", "")):
+        index["terms"].get(word, set()).discard(rid)
+    _dirty(index)
+
+def _rejoin(index, aid):
+    # The appointment's customer changed (or it went away): re-attach its reports.
+    for rid in list(index["by_appointment"].get(aid, ())):
+        report = index["reports"][rid]
+        _remove(index, report)
+        _add(index, report)
+
+def _apply(index, sheet, action, record, previous):
+    if sheet == "Reports":
+        _remove(index, previous or record)
+        if action != "delete":
+            _add(index, record)
+        return
+    aid = str(record["appointmentID"])
+    if action == "delete":
+        index["customers"].pop(aid, None)
+    else:
+        index["customers"][aid] = str(record["customerID"])
+    _rejoin(index, aid)
+
+# Reports joined with their appointment's customerID, indexed by customer,
+# appointment and date, plus an inverted index over reportContent words.
+# Built once from the cached sheets and kept current from storage change
+# events, like the availability index.
+_index = DerivedIndex(
+    ("Reports", "Appointments"), ensure_fresh,
+    lambda: _build(get_all_reports(), get_appointments()), _apply,
+)
+
+
+def _matching(index, query):
+    # Report IDs containing every query word (each as a word prefix), or
+    # None when the query has no words.
+    if index["vocabulary"] is None:
+        index["vocabulary"] = sorted(index["terms"])
+    vocabulary = index["vocabulary"]
+    matches = None
+    for word in _words(query):
+        found = set()
+        for term in vocabulary[bisect.bisect_left(vocabulary, word):]:
+            if not term.startswith(word):
+                break
+            found |= index["terms"][term]
+        matches = found if matches is None else matches & found
+    return matches
+
+def filter_options():
+    # (customer IDs, appointment IDs) that have reports, for the filter dropdowns.
+    index = _index.get()
+    with _index.lock:
+        if index["options"] is None:
+            reports = index["reports"].values()
+            index["options"] = (
+                sorted({r["customerID"] for r in reports if r["customerID"] != "Unknown"}, key=lambda c: (len(c), c)),
+                sorted({r["appointmentID"] for r in reports}, key=lambda a: (len(str(a)), str(a))),
+            )
+        return index["options"]
+
+def search_reports(query="", customer_id=None, appointment_id=None, date_from=None, date_to=None, page=1, page_size=20):
+    # Newest first. Returns (reports on the page, page shown, page count, total matches).
+    index = _index.get()
+    with _index.lock:
+        if index["order"] is None:
+            index["order"] = sorted(_sort_key(r) for r in index["reports"].values())
+        order = index["order"]
+        start = bisect.bisect_left(order, (str(date_from),)) if date_from else 0
+        end = bisect.bisect_left(order, (str(date_to) + "\x7f",)) if date_to else len(order)
+
+        candidates = []
+        matches = _matching(index, query)
+        if matches is not None:
+            candidates.append(matches)
+        if customer_id is not None:
+            candidates.append(index["by_customer"].get(str(customer_id), set()))
+        if appointment_id is not None:
+            candidates.append(index["by_appointment"].get(str(appointment_id), set()))
+        allowed = set.intersection(*candidates) if candidates else None
+
+        rids = [key[2] for key in reversed(order[start:end]) if allowed is None or key[2] in allowed]
+        page_rids, page, page_count = paginate(rids, page, page_size)
+        return [dict(index["reports"][rid]) for rid in page_rids], page, page_count, len(rids)
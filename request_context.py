@@ -0,0 +1,51 @@
+import threading
+
+from events import subscribe
+from instrumentation import current_run
+
+# Per-rerun memo of worksheet snapshots. Within one Streamlit script run each
+# sheet goes through the cache (TTL check, refresh) only once; later reads in
+# the same run reuse that snapshot. begin() at the top of every run and any
+# write or reload of a sheet from this thread clear it. Threads that never
+# call begin() (background work, scripts) read straight from the cache.
+stats = {"reads": 0, "duplicate_reads": 0, "fetches_saved": 0}
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def _count(field):
+    with _lock:
+        stats[field] += 1
+    run = current_run()
+    if run is not None:
+        run[field] = run.get(field, 0) + 1
+
+def begin():
+    _local.snapshots = {}
+
+def reuse(sheet, entry, expired):
+    # True if this run already read `sheet` and got this same snapshot.
+    snapshots = getattr(_local, "snapshots", None)
+    if snapshots is None or snapshots.get(sheet) is not entry:
+        return False
+    _count("duplicate_reads")
+    if expired:
+        _count("fetches_saved")
+    return True
+
+def remember(sheet, entry):
+    snapshots = getattr(_local, "snapshots", None)
+    if snapshots is not None:
+        snapshots[sheet] = entry
+        _count("reads")
+
+def get_stats():
+    with _lock:
+        return dict(stats)
+
+def _on_change(sheet, action, record, previous):
+    snapshots = getattr(_local, "snapshots", None)
+    if snapshots is not None:
+        snapshots.pop(sheet, None)
+
+subscribe(_on_change)
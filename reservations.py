@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+import time
+
+from config import get_setting
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; use the memory or sqlite backend there
+    fcntl = None
+
+# Compare-and-set claims on slot keys. A booking claims its slot before
+# writing, and only the first claimant wins. Claims expire after CLAIM_TTL
+# seconds (longer than the worksheet cache TTL, so a worker holding a stale
+# copy of Schedules has refreshed before the slot could be claimed again) and
+# are released early when the slot is put back on the schedule.
+#
+# RESERVATION_BACKEND selects where claims live:
+#   memory  - this process only (default, enough for a single Streamlit worker)
+#   file    - one file per claim under RESERVATION_DIR, for workers on one host
+#   sqlite  - a claims table in RESERVATION_DB, for workers sharing a disk
+CLAIM_TTL = int(get_setting("CLAIM_TTL", 3600))
+
+
+def _claim_name(key):
+    date, slot = key
+    date = date.isoformat() if hasattr(date, "isoformat") else str(date)
+    slot = getattr(slot, "value", slot)
+    return f"{date}|{slot}"
+
+
+class MemoryReservations:
+    def __init__(self):
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def claim(self, name, ttl):
+        now = time.time()
+        with self._lock:
+            if self._claims.get(name, 0) > now:
+                return False
+            self._claims[name] = now + ttl
+            return True
+
+    def release(self, name):
+        with self._lock:
+            self._claims.pop(name, None)
+
+
+class FileReservations:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name.replace("|", "_").replace(":", "").replace(os.sep, "_") + ".claim")
+
+    def _locked(self, fn):
+        with self._lock, open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                return fn()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def claim(self, name, ttl):
+        path = self._path(name)
+
+        def attempt():
+            now = time.time()
+            if os.path.exists(path):
+                with open(path) as f:
+                    expires = float(f.read() or 0)
+                if expires > now:
+                    return False
+            with open(path, "w") as f:
+                f.write(str(now + ttl))
+            return True
+        return self._locked(attempt)
+
+    def release(self, name):
+        path = self._path(name)
+
+        def attempt():
+            if os.path.exists(path):
+                os.remove(path)
+        self._locked(attempt)
+
+
+class SqliteReservations:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute("CREATE TABLE IF NOT EXISTS claims (name TEXT PRIMARY KEY, expires REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def claim(self, name, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM claims WHERE name = ? AND expires <= ?", (name, now))
+            claimed = conn.execute(
+                "INSERT OR IGNORE INTO claims (name, expires) VALUES (?, ?)", (name, now + ttl)
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def release(self, name):
+        self._conn().execute("DELETE FROM claims WHERE name = ?", (name,))
+
+
+def _make_backend():
+    backend = get_setting("RESERVATION_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryReservations()
+    if backend == "file":
+        return FileReservations(get_setting("RESERVATION_DIR", ".reservations"))
+    if backend == "sqlite":
+        return SqliteReservations(get_setting("RESERVATION_DB", "reservations.db"))
+    raise ValueError(f"Unknown RESERVATION_BACKEND: {backend!r} (expected 'memory', 'file' or 'sqlite')")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _make_backend()
+        return _backend
+
+def set_backend(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+def claim_slot(key, ttl=None):
+    # key is a slots.SlotKey; returns True if this caller now owns the slot.
+    return get_backend().claim(_claim_name(key), CLAIM_TTL if ttl is None else ttl)
+
+def release_slot(key):
+    get_backend().release(_claim_name(key))
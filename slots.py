@@ -0,0 +1,57 @@
+from collections import namedtuple
+from datetime import date as date_cls, datetime
+from enum import Enum
+
+
+class TimeSlot(Enum):
+    AM_8 = "8:00AM-9:00AM"
+    AM_9 = "9:00AM-10:00AM"
+    AM_10 = "10:00AM-11:00AM"
+    AM_11 = "11:00AM-12:00PM"
+    PM_2 = "2:00PM-3:00PM"
+    PM_3 = "3:00PM-4:00PM"
+    PM_4 = "4:00PM-5:00PM"
+
+    @classmethod
+    def parse(cls, label):
+        return _TIME_SLOTS_BY_NORMALIZED.get(_normalize(label))
+
+_TIME_SLOTS_BY_NORMALIZED = {"".join(s.value.split()).upper(): s for s in TimeSlot}
+TIME_SLOTS = [s.value for s in TimeSlot]
+
+# Canonical identity of a schedule slot. Dates are datetime.date and times
+# TimeSlot members; values that don't parse fall back to their normalized
+# string so that odd rows typed into the sheet by hand still match themselves.
+SlotKey = namedtuple("SlotKey", ["date", "time"])
+
+
+def _normalize(value):
+    return "".join(str(value).split()).upper()
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date_cls):
+        return value
+    try:
+        return date_cls.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+def slot_key(date, time):
+    parsed_date = parse_date(date)
+    parsed_time = TimeSlot.parse(time)
+    return SlotKey(
+        parsed_date if parsed_date is not None else str(date).strip().lower(),
+        parsed_time if parsed_time is not None else _normalize(time),
+    )
+
+def time_sort_key(label):
+    slot = TimeSlot.parse(label)
+    if slot is not None:
+        return (0, TIME_SLOTS.index(slot.value), "")
+    start = str(label).split("-")[0].strip().upper()
+    try:
+        return (1, datetime.strptime(start, "%I:%M%p").hour, str(label))
+    except ValueError:
+        return (2, 0, str(label))
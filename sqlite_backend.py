@@ -0,0 +1,368 @@
+import contextlib
+import logging
+import sqlite3
+import threading
+
+from archive import archivable, archive_month, cutoff_date
+from config import get_setting
+from events import publish
+from slots import slot_key
+
+# Local drop-in for google_sheets.py + auth.py. Tables and column names mirror
+# the worksheets so records look exactly like get_all_records() output.
+DB_PATH = get_setting("SQLITE_PATH", "appointments.db")
+
+TABLES = {
+    "Users": ["Username", "Password", "Role", "Email"],
+    "Customers": ["customerID", "customerUsername", "customerPassword", "Full Name", "Email", "Phone Number", "Address"],
+    "Appointments": ["appointmentID", "customerID", "Date", "Time", "Status", "appointmentReferralLetter"],
+    "Schedules": ["Date", "Time"],
+    "Reports": ["reportID", "appointmentID", "reportDate", "reportContent"],
+    "Files": ["fileName", "filePath", "driveFileID"],
+}
+PRIMARY_KEYS = {"Customers": "customerID", "Appointments": "appointmentID", "Reports": "reportID"}
+INTEGER_COLUMNS = {"customerID", "appointmentID", "reportID"}
+INDEXES = [
+    ("Users", ["Username"]),
+    ("Users", ["Email"]),
+    ("Customers", ["customerUsername"]),
+    ("Appointments", ["customerID"]),
+    ("Appointments", ["Date", "Time"]),
+    ("Schedules", ["Date", "Time"]),
+    ("Reports", ["appointmentID"]),
+    ("Files", ["filePath"]),
+]
+# Archive partitions (see archive.py) are one table per hot table, with the
+# month in an extra archiveMonth column.
+ARCHIVE_TABLES = {"Appointments": "Appointments_archive", "Reports": "Reports_archive"}
+ARCHIVE_INDEXES = [
+    ("Appointments_archive", ["archiveMonth"]),
+    ("Appointments_archive", ["customerID"]),
+    ("Reports_archive", ["archiveMonth"]),
+    ("Reports_archive", ["appointmentID"]),
+]
+
+_local = threading.local()
+_write_lock = threading.Lock()
+log = logging.getLogger(__name__)
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _column_def(table, col):
+    if PRIMARY_KEYS.get(table) == col:
+        return f"{_q(col)} INTEGER PRIMARY KEY"
+    return f"{_q(col)} {'INTEGER' if col in INTEGER_COLUMNS else 'TEXT'}"
+
+def _create_schema(conn):
+    for table, columns in TABLES.items():
+        cols = ", ".join(_column_def(table, c) for c in columns)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {_q(table)} ({cols})")
+    for table, archive in ARCHIVE_TABLES.items():
+        cols = ", ".join(_column_def(table, c) for c in TABLES[table])
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {_q(archive)} ({cols}, "archiveMonth" TEXT)')
+    for table, columns in INDEXES + ARCHIVE_INDEXES:
+        name = f"idx_{table}_{'_'.join(c.replace(' ', '') for c in columns)}"
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {_q(name)} ON {_q(table)} ({', '.join(map(_q, columns))})")
+    conn.commit()
+
+def _conn():
+    # One connection per thread; Streamlit runs each session on its own thread.
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        _create_schema(conn)
+        _local.conn = conn
+    return conn
+
+@contextlib.contextmanager
+def _transaction(immediate=False):
+    # This thread's connection inside one write transaction: committed when
+    # the block ends, rolled back if it raises so the connection (and the
+    # database write lock) isn't left inside a half-done transaction.
+    with _write_lock:
+        conn = _conn()
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+def _record(row):
+    return {k: ("" if row[k] is None else row[k]) for k in row.keys()}
+
+def _select(table, where="", params=()):
+    cur = _conn().execute(f"SELECT * FROM {_q(table)} {where} ORDER BY rowid", params)
+    return [_record(r) for r in cur]
+
+def _insert(conn, table, values):
+    if table in ARCHIVE_TABLES and values[0] is None:
+        # SQLite would reuse the IDs of archived rows; continue after them instead.
+        key = _q(PRIMARY_KEYS[table])
+        last = conn.execute(
+            f"SELECT max(m) FROM (SELECT max({key}) AS m FROM {_q(table)} "
+            f"UNION ALL SELECT max({key}) FROM {_q(ARCHIVE_TABLES[table])})"
+        ).fetchone()[0]
+        values = [(last or 0) + 1] + list(values[1:])
+    columns = TABLES[table][:len(values)]
+    cur = conn.execute(
+        f"INSERT INTO {_q(table)} ({', '.join(map(_q, columns))}) VALUES ({', '.join('?' * len(values))})",
+        values,
+    )
+    return cur.lastrowid
+
+def _find_slot(conn, date, time):
+    key = slot_key(date, time)
+    day = key.date if isinstance(key.date, str) else key.date.isoformat()
+    rows = conn.execute('SELECT rowid, * FROM "Schedules" WHERE lower(trim("Date")) = ?', (day,)).fetchall()
+    for row in rows:
+        if slot_key(row["Date"], row["Time"]) == key:
+            return row
+    return None
+
+
+def save_customer(data):
+    with _transaction() as conn:
+        cid = _insert(conn, "Customers", [None] + data)
+    publish("Customers", "append", dict(zip(TABLES["Customers"], [cid] + data)))
+    return cid
+
+def save_appointment(data, referral_path=None):
+    # The slot check, appointment insert and slot delete share one IMMEDIATE
+    # transaction, so two workers can never both book the same slot.
+    if referral_path is None:
+        referral_path = ""
+    with _transaction(immediate=True) as conn:
+        slot = _find_slot(conn, data[1], data[2])
+        if slot is None:
+            log.info("Slot no longer available: %s - %s", data[1], data[2])
+            return None
+        appointment_id = _insert(conn, "Appointments", [None] + data + [referral_path])
+        conn.execute('DELETE FROM "Schedules" WHERE rowid = ?', (slot["rowid"],))
+    publish("Appointments", "append", dict(zip(TABLES["Appointments"], [appointment_id] + data + [referral_path])))
+    publish("Schedules", "delete", {"Date": slot["Date"], "Time": slot["Time"]})
+    return appointment_id
+
+def save_file_metadata(data):
+    with _transaction() as conn:
+        _insert(conn, "Files", data)
+    publish("Files", "append", dict(zip(TABLES["Files"], data)))
+
+def find_file(file_path):
+    rows = _select("Files", "WHERE filePath = ?", (file_path,))
+    return rows[0]["driveFileID"] if rows else None
+
+def get_appointments():
+    return _select("Appointments")
+
+def update_schedule(date, time):
+    with _transaction() as conn:
+        _insert(conn, "Schedules", [date, time])
+    publish("Schedules", "append", {"Date": date, "Time": time})
+
+def get_pharmacist_schedule():
+    return _select("Schedules")
+
+def update_appointment_status(appointment_id, new_status=None, new_date=None, new_time=None):
+    return update_appointments([{
+        "appointment_id": appointment_id,
+        "new_status": new_status,
+        "new_date": new_date,
+        "new_time": new_time,
+    }]) == 1
+
+def update_appointments(updates):
+    # A new date/time books its slot like save_appointment: the Schedules row
+    # is deleted in the same IMMEDIATE transaction, or the update is skipped.
+    fields = (("new_status", "Status"), ("new_date", "Date"), ("new_time", "Time"))
+    applied, slots = [], []
+    with _transaction(immediate=True) as conn:
+        for update in updates:
+            row = conn.execute('SELECT * FROM "Appointments" WHERE "appointmentID" = ?', (update["appointment_id"],)).fetchone()
+            if row is None:
+                log.warning("Appointment not found for update: %s", update["appointment_id"])
+                continue
+            changes = {col: update[key] for key, col in fields if update.get(key)}
+            date, time = changes.get("Date", row["Date"]), changes.get("Time", row["Time"])
+            if slot_key(date, time) != slot_key(row["Date"], row["Time"]):
+                slot = _find_slot(conn, date, time)
+                if slot is None:
+                    log.info("Slot no longer available: %s - %s", date, time)
+                    continue
+                conn.execute('DELETE FROM "Schedules" WHERE rowid = ?', (slot["rowid"],))
+                slots.append(slot)
+            if changes:
+                conn.execute(
+                    f'UPDATE "Appointments" SET {", ".join(f"{_q(c)} = ?" for c in changes)} WHERE "appointmentID" = ?',
+                    list(changes.values()) + [row["appointmentID"]],
+                )
+            previous = _record(row)
+            applied.append((dict(previous, **changes), previous))
+    for record, previous in applied:
+        publish("Appointments", "update", record, previous)
+    for slot in slots:
+        publish("Schedules", "delete", {"Date": slot["Date"], "Time": slot["Time"]})
+    return len(applied)
+
+def get_all_customers():
+    return _select("Customers")
+
+def save_report(data):
+    with _transaction() as conn:
+        rid = _insert(conn, "Reports", [None] + data)
+    publish("Reports", "append", dict(zip(TABLES["Reports"], [rid] + data)))
+
+def remove_schedule_slot(date, time):
+    with _transaction() as conn:
+        slot = _find_slot(conn, date, time)
+        if slot is not None:
+            conn.execute('DELETE FROM "Schedules" WHERE rowid = ?', (slot["rowid"],))
+    if slot is None:
+        log.warning("Slot not found for deletion: %s - %s", date, time)
+        return
+    publish("Schedules", "delete", {"Date": slot["Date"], "Time": slot["Time"]})
+
+def restore_schedule_slot(date, time):
+    with _transaction() as conn:
+        if _find_slot(conn, date, time) is not None:
+            return  # already exists
+        _insert(conn, "Schedules", [date, time])
+    publish("Schedules", "append", {"Date": date, "Time": time})
+
+def add_schedule_slots(slots):
+    with _transaction() as conn:
+        existing = {slot_key(r["Date"], r["Time"]) for r in conn.execute('SELECT "Date", "Time" FROM "Schedules"')}
+        new_rows = []
+        for date, time in slots:
+            key = slot_key(date, time)
+            if key not in existing:
+                existing.add(key)
+                new_rows.append([str(date), time])
+        conn.executemany('INSERT INTO "Schedules" ("Date", "Time") VALUES (?, ?)', new_rows)
+    for date, time in new_rows:
+        publish("Schedules", "append", {"Date": date, "Time": time})
+    return len(new_rows)
+
+def remove_schedule_slots(slots):
+    with _transaction() as conn:
+        found = [row for row in (_find_slot(conn, d, t) for d, t in slots) if row is not None]
+        conn.executemany('DELETE FROM "Schedules" WHERE rowid = ?', [(row["rowid"],) for row in found])
+    for row in found:
+        publish("Schedules", "delete", {"Date": row["Date"], "Time": row["Time"]})
+    return len(found)
+
+def get_all_reports():
+    return _select("Reports")
+
+def _move_to_archive(conn, table, picked):
+    # picked: [(record, month)]
+    columns = TABLES[table] + ["archiveMonth"]
+    key = PRIMARY_KEYS[table]
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {_q(ARCHIVE_TABLES[table])} ({', '.join(map(_q, columns))}) "
+        f"VALUES ({', '.join('?' * len(columns))})",
+        [[record[c] for c in TABLES[table]] + [month] for record, month in picked],
+    )
+    conn.executemany(f"DELETE FROM {_q(table)} WHERE {_q(key)} = ?", [(record[key],) for record, _ in picked])
+
+def archive_appointments(older_than_days=None, today=None):
+    cutoff = cutoff_date(older_than_days, today)
+    with _transaction(immediate=True) as conn:
+        moving = [
+            (record, archive_month(record))
+            for record in map(_record, conn.execute('SELECT * FROM "Appointments" ORDER BY rowid'))
+            if archivable(record, cutoff)
+        ]
+        months = {str(record["appointmentID"]): month for record, month in moving}
+        linked = [
+            (record, months[str(record["appointmentID"])])
+            for record in map(_record, conn.execute('SELECT * FROM "Reports" ORDER BY rowid'))
+            if str(record["appointmentID"]) in months
+        ]
+        _move_to_archive(conn, "Appointments", moving)
+        _move_to_archive(conn, "Reports", linked)
+    for table, picked in (("Appointments", moving), ("Reports", linked)):
+        for record, _ in picked:
+            publish(table, "delete", record)
+    return len(moving)
+
+def _archived_records(table, month, column, value):
+    clauses, params = [], []
+    if month:
+        clauses.append('"archiveMonth" = ?')
+        params.append(month)
+    if value is not None:
+        clauses.append(f"{_q(column)} = ?")
+        params.append(value)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    records = _select(ARCHIVE_TABLES[table], where, params)
+    for record in records:
+        del record["archiveMonth"]
+    return records
+
+def get_archived_months():
+    rows = _conn().execute('SELECT DISTINCT "archiveMonth" FROM "Appointments_archive" ORDER BY 1')
+    return [row[0] for row in rows]
+
+def get_archived_appointments(month=None, customer_id=None):
+    return _archived_records("Appointments", month, "customerID", customer_id)
+
+def get_archived_reports(month=None, appointment_id=None):
+    return _archived_records("Reports", month, "appointmentID", appointment_id)
+
+def ensure_fresh(*sheets):
+    pass  # every read already hits the database
+
+def invalidate_cache(sheet=None):
+    for name in ([sheet] if sheet else list(TABLES)):
+        publish(name, "reload")
+
+
+def register_user(username, password, role, email):
+    with _transaction() as conn:
+        _insert(conn, "Users", [username, password, role, email])
+    publish("Users", "append", dict(zip(TABLES["Users"], [username, password, role, email])))
+
+def login_user(username_or_email, password):
+    row = _conn().execute(
+        'SELECT * FROM "Users" WHERE ("Username" = ? OR "Email" = ?) AND "Password" = ? ORDER BY rowid LIMIT 1',
+        (username_or_email, username_or_email, password),
+    ).fetchone()
+    if row is None:
+        return None, None, None
+    return row["Role"], row["Username"], row["Email"]
+
+def get_customer_id(username):
+    row = _conn().execute(
+        'SELECT "customerID" FROM "Customers" WHERE "customerUsername" = ? ORDER BY rowid LIMIT 1', (username,)
+    ).fetchone()
+    return str(row["customerID"]) if row else None
+
+def check_email_exists(email):
+    return _conn().execute('SELECT 1 FROM "Users" WHERE "Email" = ? LIMIT 1', (email,)).fetchone() is not None
+
+
+# Bulk access used by migrate.py
+
+def export_table(table):
+    rows = _conn().execute(f"SELECT {', '.join(map(_q, TABLES[table]))} FROM {_q(table)} ORDER BY rowid").fetchall()
+    return list(TABLES[table]), [["" if v is None else v for v in row] for row in rows]
+
+def import_table(table, headers, rows):
+    # Replaces the table's contents; columns the schema doesn't know are dropped.
+    columns = [h for h in headers if h in TABLES[table]]
+    positions = [headers.index(c) for c in columns]
+    with _transaction() as conn:
+        conn.execute(f"DELETE FROM {_q(table)}")
+        conn.executemany(
+            f"INSERT INTO {_q(table)} ({', '.join(map(_q, columns))}) VALUES ({', '.join('?' * len(columns))})",
+            [[row[p] if p < len(row) else "" for p in positions] for row in rows],
+        )
+    publish(table, "reload")
+    return len(rows)
@@ -0,0 +1,30 @@
+from config import get_setting
+
+# Which backend the app talks to: "sheets" (Google Sheets, the default) or
+# "sqlite" (local database, see sqlite_backend.py). Both expose the same functions.
+BACKEND = get_setting("STORAGE_BACKEND", "sheets")
+
+if BACKEND == "sqlite":
+    from sqlite_backend import (
+        save_customer, save_appointment, save_file_metadata, find_file,
+        get_appointments, get_pharmacist_schedule, get_all_customers, get_all_reports,
+        update_schedule, update_appointment_status, update_appointments,
+        save_report, remove_schedule_slot, restore_schedule_slot,
+        add_schedule_slots, remove_schedule_slots,
+        archive_appointments, get_archived_months, get_archived_appointments, get_archived_reports,
+        ensure_fresh, invalidate_cache,
+        register_user, login_user, get_customer_id, check_email_exists,
+    )
+elif BACKEND == "sheets":
+    from google_sheets import (
+        save_customer, save_appointment, save_file_metadata, find_file,
+        get_appointments, get_pharmacist_schedule, get_all_customers, get_all_reports,
+        update_schedule, update_appointment_status, update_appointments,
+        save_report, remove_schedule_slot, restore_schedule_slot,
+        add_schedule_slots, remove_schedule_slots,
+        archive_appointments, get_archived_months, get_archived_appointments, get_archived_reports,
+        ensure_fresh, invalidate_cache,
+    )
+    from auth import register_user, login_user, get_customer_id, check_email_exists
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND: {BACKEND!r} (expected 'sheets' or 'sqlite')")
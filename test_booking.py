@@ -0,0 +1,87 @@
+import random
+import threading
+
+import pytest
+
+import availability
+import google_sheets
+from fake_gspread import START, FakeAPIError
+import write_queue
+from reservations import claim_slot
+from slots import slot_key
+
+
+def _next_slot():
+    return availability.next_free_slots(1, from_date=START)[0]
+
+
+def test_failed_booking_releases_its_claim(fake_sheets, monkeypatch):
+    date, time = _next_slot()
+    monkeypatch.setattr(google_sheets, "CACHE_TTL", 0)
+    fake_sheets.quota_per_minute = 0  # every request now fails with a 429
+    with pytest.raises(FakeAPIError):
+        google_sheets.save_appointment(["1", date, time, "Pending Confirmation"])
+    fake_sheets.quota_per_minute = None
+    assert claim_slot(slot_key(date, time))
+
+
+def test_reschedule_books_the_new_slot(fake_sheets):
+    date, time = _next_slot()
+    appointment = google_sheets.get_appointments()[0]
+    assert google_sheets.update_appointment_status(appointment["appointmentID"], "Rescheduled", date, time)
+    assert google_sheets.save_appointment(["1", date, time, "Pending Confirmation"]) is None
+    assert (date, time) not in {(s["Date"], s["Time"]) for s in google_sheets.get_pharmacist_schedule()}
+    # Nobody else can reschedule into it either.
+    other = google_sheets.get_appointments()[1]
+    assert not google_sheets.update_appointment_status(other["appointmentID"], "Rescheduled", date, time)
+
+
+def _schedule(fake):
+    return [tuple(row) for row in fake.worksheet("Schedules").get_all_values()[1:]]
+
+
+def test_concurrent_bookings_and_reschedules_never_share_a_slot(fake_sheets):
+    slots = availability.next_free_slots(20, from_date=START)
+    appointments = google_sheets.get_appointments()
+    before = _schedule(fake_sheets)
+    won = []
+    won_lock = threading.Lock()
+    start = threading.Barrier(8)
+
+    def worker(n):
+        order = list(slots)
+        random.Random(n).shuffle(order)
+        start.wait()
+        for date, time in order:
+            if n % 2:
+                ok = google_sheets.save_appointment([str(n), date, time, "Pending Confirmation"]) is not None
+            else:
+                ok = google_sheets.update_appointment_status(appointments[n]["appointmentID"], "Rescheduled", date, time)
+            if ok:
+                with won_lock:
+                    won.append((date, time))
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert write_queue.flush(timeout=10)
+
+    assert sorted(won) == sorted(slots)
+    taken = {(str(d), t) for d, t in slots}
+    assert _schedule(fake_sheets) == [s for s in before if s not in taken]
+
+
+def test_booking_deletes_its_own_slot_after_another_worker_changed_the_sheet(fake_sheets):
+    date, time = _next_slot()
+    before = _schedule(fake_sheets)
+    google_sheets.get_pharmacist_schedule()  # cache the current rows
+    # Another worker deletes the row above ours straight in the sheet.
+    row = before.index((str(date), time))
+    assert row > 0
+    del fake_sheets.worksheet("Schedules")._rows[row]
+
+    assert google_sheets.save_appointment(["1", date, time, "Pending Confirmation"]) is not None
+    assert write_queue.flush(timeout=10)
+    assert _schedule(fake_sheets) == before[:row - 1] + before[row + 1:]
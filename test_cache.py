@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+import google_sheets
+
+
+def test_a_slow_fetch_does_not_block_other_sheets(fake_sheets, monkeypatch):
+    appointments = fake_sheets.worksheet("Appointments")
+    real_get_all_values = appointments.get_all_values
+    started, release = threading.Event(), threading.Event()
+
+    def slow_get_all_values():
+        started.set()
+        release.wait(10)
+        return real_get_all_values()
+    monkeypatch.setattr(appointments, "get_all_values", slow_get_all_values)
+
+    reader = threading.Thread(target=google_sheets.get_appointments)
+    reader.start()
+    try:
+        assert started.wait(10)
+        assert google_sheets.get_pharmacist_schedule()
+        assert reader.is_alive()
+    finally:
+        release.set()
+        reader.join(10)
+
+
+def test_a_write_during_a_fetch_is_not_lost(fake_sheets, monkeypatch):
+    real_fetch = google_sheets._fetch
+
+    def fetch_then_write(sheet):
+        entry = real_fetch(sheet)
+        fetches.append(sheet)
+        if len(fetches) == 1:
+            # Lands after the fetch and before its result is cached.
+            written.append(google_sheets.add_schedule_slots([("2031-01-06", "9:00AM-10:00AM")]))
+        return entry
+    fetches, written = [], []
+    monkeypatch.setattr(google_sheets, "_fetch", fetch_then_write)
+
+    slots = {(str(s["Date"]), s["Time"]) for s in google_sheets.get_pharmacist_schedule()}
+    assert written == [1]
+    assert ("2031-01-06", "9:00AM-10:00AM") in slots
+
+
+@pytest.fixture
+def appointments(fake_sheets, monkeypatch):
+    # Appointments cached, then edited behind the app's back; every read after this is a refresh.
+    google_sheets.get_appointments()
+    monkeypatch.setattr(google_sheets, "CACHE_TTL", 0)
+    fake_sheets.reset_calls()
+    return fake_sheets.worksheet("Appointments")
+
+
+def _statuses():
+    return {str(a["appointmentID"]): a["Status"] for a in google_sheets.get_appointments()}
+
+
+def test_delta_refresh_picks_up_an_external_append(fake_sheets, appointments):
+    refreshes = google_sheets.cache_stats["delta_refreshes"]
+    appointments._rows.append(["90001", "1", "2031-01-06", "9:00AM-10:00AM", "Confirmed", ""])
+    assert _statuses()["90001"] == "Confirmed"
+    assert google_sheets.cache_stats["delta_refreshes"] == refreshes + 1
+    assert fake_sheets.calls["Appointments.get_all_values"] == 0
+
+
+def test_delta_refresh_reloads_after_an_external_delete(fake_sheets, appointments):
+    deleted = str(appointments._rows.pop(5)[0])
+    statuses = _statuses()
+    assert deleted not in statuses
+    assert len(statuses) == len(appointments._rows) - 1
+    assert fake_sheets.calls["Appointments.get_all_values"] == 1
+
+
+def test_verify_catches_an_external_edit_mid_sheet(fake_sheets, appointments, monkeypatch):
+    monkeypatch.setattr(google_sheets, "VERIFY_EVERY", 1)
+    monkeypatch.setattr(google_sheets, "VERIFY_ROWS", 10)
+    failures = google_sheets.cache_stats["verify_failures"]
+    row = appointments._rows[5]
+    row[4] = "Cancelled" if row[4] != "Cancelled" else "Completed"
+    assert _statuses()[str(row[0])] == row[4]
+    assert google_sheets.cache_stats["verify_failures"] == failures + 1
+    assert fake_sheets.calls["Appointments.get_all_values"] == 1
+
+
+def test_cache_delete_shifts_the_row_index(fake_sheets):
+    index = google_sheets._row_index("Schedules", google_sheets.SLOT_COLUMNS)
+    schedules = google_sheets._cache["Schedules"]
+    deleted = google_sheets._index_key(schedules["records"][2], google_sheets.SLOT_COLUMNS)
+    below = google_sheets._index_key(schedules["records"][3], google_sheets.SLOT_COLUMNS)
+    assert index[below] == 5
+
+    google_sheets._cache_delete("Schedules", 2)
+    assert deleted not in index
+    assert index[below] == 4
+    assert index == {
+        google_sheets._index_key(r, google_sheets.SLOT_COLUMNS): row
+        for row, r in enumerate(schedules["records"], start=2)
+    }
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import drive_uploads
+import google_sheets
+from fake_drive import FakeDrive
+from fake_gspread import FakeAPIError
+
+
+@pytest.fixture
+def drive(tmp_path, monkeypatch):
+    monkeypatch.setattr(drive_uploads, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(drive_uploads, "get_folder_id", lambda: "referrals")
+    fake = FakeDrive()
+    drive_uploads.set_drive_service(lambda: fake)
+    yield fake
+    drive_uploads.set_drive_service(None)
+
+
+def test_failed_upload_is_recorded_and_retried(drive):
+    drive.fail_next = 1
+    saved = []
+    path, digest = drive_uploads.store_referral(b"referral one", "letter.pdf")
+    future = drive_uploads.submit_upload(path, digest, name="letter.pdf", on_complete=saved.append)
+    with pytest.raises(FakeAPIError):
+        future.result(timeout=10)
+    assert [u["file_path"] for u in drive_uploads.failed_uploads()] == [path]
+    assert saved == []
+
+    assert drive_uploads.retry_failed_uploads() == 1
+    file_id = drive_uploads.submit_upload(path, digest).result(timeout=10)
+    assert saved == [file_id]
+    assert drive.files_created[file_id] == {"name": "letter.pdf", "parents": ["referrals"], "content": b"referral one"}
+    assert drive_uploads.failed_uploads() == []
+
+
+def test_retry_after_on_complete_failure_does_not_upload_again(drive):
+    saved = []
+
+    def on_complete(file_id):
+        if not saved:
+            saved.append(None)
+            raise FakeAPIError(429, "Quota exceeded")
+        saved.append(file_id)
+
+    path, digest = drive_uploads.store_referral(b"referral two", "letter.pdf")
+    with pytest.raises(FakeAPIError):
+        drive_uploads.submit_upload(path, digest, on_complete=on_complete).result(timeout=10)
+    assert drive_uploads.failed_uploads()[0]["uploaded"]
+
+    assert drive_uploads.retry_failed_uploads() == 1
+    file_id = drive_uploads.submit_upload(path, digest).result(timeout=10)
+    assert saved == [None, file_id]
+    assert list(drive.files_created) == [file_id]
+
+
+def test_referrals_keep_their_original_name(drive):
+    path, digest = drive_uploads.store_referral(b"referral three", "C:\\scans\\Referral Letter.PDF")
+    assert os.path.basename(path) == "Referral Letter.PDF"
+    assert os.path.basename(os.path.dirname(path)) == digest
+    assert drive_uploads.store_referral(b"referral three", "Referral Letter.PDF") == (path, digest)
+    _, other = drive_uploads.store_referral(b"something else", "Referral Letter.PDF")
+    assert other != digest
+
+
+def test_referral_location_writes_nothing(drive):
+    path, digest = drive_uploads.referral_location(b"referral four", "letter.pdf")
+    assert not os.path.exists(path)
+    assert drive_uploads.store_referral(b"referral four", "letter.pdf") == (path, digest)
+    assert os.path.exists(path)
+
+
+def test_files_recorded_by_an_earlier_run_are_not_uploaded_again(drive):
+    saved = []
+    path, digest = drive_uploads.store_referral(b"referral five", "letter.pdf")
+    future = drive_uploads.submit_upload(
+        path, digest, on_complete=saved.append, existing=lambda: "fake-recorded",
+    )
+    assert future.result(timeout=10) == "fake-recorded"
+    assert drive.files_created == {}
+    assert saved == []
+
+
+def test_find_file_reads_the_files_sheet(fake_sheets):
+    assert google_sheets.find_file("uploads/abc/letter.pdf") is None
+    google_sheets.save_file_metadata(["letter.pdf", "uploads/abc/letter.pdf", "drive-123"])
+    assert google_sheets.find_file("uploads/abc/letter.pdf") == "drive-123"
@@ -0,0 +1,44 @@
+import threading
+
+import id_allocator
+
+
+def test_concurrent_next_id_is_unique_and_contiguous(tmp_path, monkeypatch):
+    monkeypatch.setattr(id_allocator, "SEQUENCE_FILE", str(tmp_path / "id_sequences.json"))
+    threads, per_thread = 16, 200
+    ids = []
+    ids_lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker():
+        start.wait()
+        for _ in range(per_thread):
+            new_id = id_allocator.next_id("Appointments", lambda: 41)
+            with ids_lock:
+                ids.append(new_id)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert len(ids) == len(set(ids)) == threads * per_thread
+    assert sorted(ids) == list(range(42, 42 + threads * per_thread))
+
+
+def test_bootstrap_only_runs_for_new_sequences(tmp_path, monkeypatch):
+    monkeypatch.setattr(id_allocator, "SEQUENCE_FILE", str(tmp_path / "id_sequences.json"))
+    calls = []
+
+    def bootstrap():
+        calls.append(1)
+        return 10
+
+    assert id_allocator.next_id("Reports", bootstrap) == 11
+    assert id_allocator.next_id("Reports", bootstrap) == 12
+    assert len(calls) == 1
+
+    id_allocator.reset_sequence("Reports")
+    assert id_allocator.next_id("Reports", bootstrap) == 11
+    assert len(calls) == 2
@@ -0,0 +1,41 @@
+import threading
+
+import auth
+import availability
+import customer_appointments
+import report_store
+import google_sheets
+
+
+def _within(seconds, fn):
+    result = []
+    worker = threading.Thread(target=lambda: result.append(fn()), daemon=True)
+    worker.start()
+    worker.join(seconds)
+    assert result, f"{fn.__qualname__} did not return within {seconds}s"
+    return result[0]
+
+
+def test_availability_builds_with_zero_ttl(fake_sheets, monkeypatch):
+    monkeypatch.setattr(google_sheets, "CACHE_TTL", 0)
+    assert len(_within(10, availability.available_dates)) == 30
+
+
+def test_login_with_zero_ttl(fake_sheets, monkeypatch):
+    monkeypatch.setattr(google_sheets, "CACHE_TTL", 0)
+    role, username, _ = _within(10, lambda: auth.login_user("user5@example.com", "secret!123"))
+    assert (role, username) == ("Customer", "user5")
+    assert _within(10, lambda: auth.get_customer_id("user5")) == "5"
+
+
+def test_customer_appointments_with_zero_ttl(fake_sheets, monkeypatch):
+    monkeypatch.setattr(google_sheets, "CACHE_TTL", 0)
+    views = _within(10, lambda: customer_appointments.customer_appointments(5))
+    mine = [a for a in google_sheets.get_appointments() if str(a["customerID"]) == "5"]
+    assert len(views["active"]) + len(views["past"]) == len(mine)
+
+
+def test_report_search_with_zero_ttl(fake_sheets, monkeypatch):
+    monkeypatch.setattr(google_sheets, "CACHE_TTL", 0)
+    _, _, _, total = _within(10, report_store.search_reports)
+    assert total == len(google_sheets.get_all_reports())
@@ -0,0 +1,26 @@
+from datetime import date, datetime
+
+from slots import TIME_SLOTS, TimeSlot, slot_key, time_sort_key
+
+
+def test_slot_key_ignores_whitespace_and_case():
+    expected = (date(2024, 3, 5), TimeSlot.AM_9)
+    assert slot_key("2024-03-05", "9:00AM-10:00AM") == expected
+    assert slot_key(" 2024-03-05 ", "9:00 am - 10:00 am") == expected
+    assert slot_key(date(2024, 3, 5), "9:00am-10:00AM\n") == expected
+    assert slot_key(datetime(2024, 3, 5, 14, 30), TimeSlot.AM_9.value) == expected
+
+
+def test_unparsable_values_still_match_themselves():
+    key = slot_key("next Tuesday ", "lunch time")
+    assert key == ("next tuesday", "LUNCHTIME")
+    assert slot_key(" Next Tuesday", "Lunch Time") == key
+    assert slot_key("2024-02-30", "9:00AM-10:00AM") == ("2024-02-30", TimeSlot.AM_9)
+    assert key != slot_key("2024-03-05", "lunch time")
+
+
+def test_time_sort_key_orders_known_slots_then_other_times_then_junk():
+    labels = ["whenever", "1:00PM-2:00PM", TIME_SLOTS[3], "7:00am-8:00am", TIME_SLOTS[0], "4:00 pm - 5:00 pm"]
+    assert sorted(labels, key=time_sort_key) == [
+        TIME_SLOTS[0], TIME_SLOTS[3], "4:00 pm - 5:00 pm", "7:00am-8:00am", "1:00PM-2:00PM", "whenever",
+    ]
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import sqlite_backend
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_backend, "DB_PATH", str(tmp_path / "appointments.db"))
+    sqlite_backend._local.__dict__.clear()
+    yield
+    sqlite_backend._local.__dict__.clear()
+
+
+def test_a_failed_transaction_is_rolled_back(db, monkeypatch):
+    sqlite_backend.add_schedule_slots([("2030-01-02", "8:00AM"), ("2030-01-02", "9:00AM")])
+    real_insert = sqlite_backend._insert
+
+    def insert_then_fail(conn, table, values):
+        real_insert(conn, table, values)
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(sqlite_backend, "_insert", insert_then_fail)
+    with pytest.raises(sqlite3.OperationalError):
+        sqlite_backend.save_appointment(["1", "2030-01-02", "8:00AM", "Pending Confirmation"])
+    monkeypatch.setattr(sqlite_backend, "_insert", real_insert)
+
+    assert sqlite_backend.get_appointments() == []
+    # The connection is usable again, and the slot is still bookable.
+    assert sqlite_backend.save_appointment(["1", "2030-01-02", "8:00AM", "Pending Confirmation"]) is not None
+    assert [s["Time"] for s in sqlite_backend.get_pharmacist_schedule()] == ["9:00AM"]
+
+
+def test_sqlite_mode_never_loads_the_sheets_stack(tmp_path):
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", WRITE_QUEUE_FILE=str(tmp_path / "pending_writes.jsonl"))
+    code = (
+        "import sys, passwords, storage, availability, customer_appointments, report_store, drive_uploads\n"
+        "print(sorted({'google_sheets', 'auth', 'write_queue'} & set(sys.modules)))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=here, env=env, capture_output=True, check=True)
+    assert result.stdout.strip() == b"[]"
+
+
+def test_find_file(db):
+    assert sqlite_backend.find_file("uploads/abc/letter.pdf") is None
+    sqlite_backend.save_file_metadata(["letter.pdf", "uploads/abc/letter.pdf", "drive-123"])
+    assert sqlite_backend.find_file("uploads/abc/letter.pdf") == "drive-123"
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+
+import availability
+import google_sheets
+import instrumentation
+import write_queue
+from fake_gspread import START, FakeAPIError
+from reservations import claim_slot
+from slots import slot_key
+
+
+def _slots(fake, title):
+    return [tuple(row) for row in fake.worksheet(title).get_all_values()[1:]]
+
+
+def test_a_bad_entry_is_dropped_without_the_rest_of_its_batch(fake_sheets, monkeypatch, caplog):
+    (date1, time1), (date2, time2) = availability.next_free_slots(2, from_date=START)
+    appointment = google_sheets.get_appointments()[0]
+    real_batch_update = fake_sheets.batch_update
+
+    def batch_update(body):
+        for request in body["requests"]:
+            for row in request.get("appendCells", {}).get("rows", []):
+                if any(cell["userEnteredValue"].get("stringValue") == "rejected" for cell in row["values"]):
+                    raise FakeAPIError(400, "Invalid value")
+        return real_batch_update(body)
+    monkeypatch.setattr(fake_sheets, "batch_update", batch_update)
+    failed = write_queue.stats["failed"]
+
+    # Queued together, so the flusher first sends all three in one batch.
+    with write_queue.hold():
+        rejected = google_sheets.save_appointment(["rejected", date1, time1, "Pending Confirmation"])
+        booked = google_sheets.save_appointment(["1", date2, time2, "Pending Confirmation"])
+        google_sheets.update_appointment_status(appointment["appointmentID"], "Completed")
+    assert write_queue.flush(timeout=10)
+
+    assert write_queue.stats["failed"] == failed + 1
+    assert "Dropping queued write" in caplog.text
+    statuses = {row[0]: row[4] for row in fake_sheets.worksheet("Appointments").get_all_values()[1:]}
+    assert str(rejected) not in statuses
+    assert str(booked) in statuses
+    assert statuses[str(appointment["appointmentID"])] == "Completed"
+    # The dropped booking's slot is back; the next one went, not its neighbour.
+    schedule = _slots(fake_sheets, "Schedules")
+    assert (str(date1), time1) in schedule
+    assert (str(date2), time2) not in schedule
+    assert claim_slot(slot_key(date1, time1))
+    assert (date1, time1) in {(s["Date"], s["Time"]) for s in google_sheets.get_pharmacist_schedule()}
+
+
+def test_flushed_writes_are_charged_to_the_page_that_queued_them(fake_sheets):
+    date, time = availability.next_free_slots(1, from_date=START)[0]
+    with instrumentation.attributed_to("Book Appointment"):
+        google_sheets.save_appointment(["1", date, time, "Pending Confirmation"])
+    assert write_queue.flush(timeout=10)
+
+    pages = {row["page"] for row in instrumentation.snapshot()["calls"] if row["name"] == "spreadsheet.batch_update"}
+    assert "Book Appointment" in pages
+
+
+def test_a_queue_file_in_use_cannot_be_loaded_by_another_process(tmp_path):
+    env = dict(os.environ, WRITE_QUEUE_FILE=str(tmp_path / "pending_writes.jsonl"))
+    here = os.path.dirname(os.path.abspath(__file__))
+    holder = subprocess.Popen(
+        [sys.executable, "-c", "import time, write_queue; print('loaded', flush=True); time.sleep(60)"],
+        cwd=here, env=env, stdout=subprocess.PIPE,
+    )
+    try:
+        assert holder.stdout.readline().strip() == b"loaded"
+        second = subprocess.run([sys.executable, "-c", "import write_queue"], cwd=here, env=env, capture_output=True)
+    finally:
+        holder.kill()
+        holder.wait()
+    assert second.returncode != 0
+    assert b"in use by another process" in second.stderr
@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; keep to one process per QUEUE_FILE by hand there
+    fcntl = None
+
+from config import get_setting
+from instrumentation import attributed_to, current_page
+
+# Durable queue of pending spreadsheet writes. Each entry is a list of
+# JSON-serializable (sheet, write) pairs that must be applied together.
+# Entries are appended to QUEUE_FILE (fsynced) before enqueue() returns, and a
+# background thread hands them, oldest first, to the applier registered with
+# set_applier() in batches of up to MAX_BATCH. Rate limits (429), server
+# errors and network failures are retried with exponential backoff; an entry
+# only leaves the file once it has been applied. When a batch fails for any
+# other reason its entries are retried one at a time, so only the entry that
+# fails on its own is dropped. Entries left over from a previous run are
+# flushed on startup.
+#
+# Each entry remembers the app.py page that queued it; a batch only holds
+# entries from one page and its API calls are attributed to that page.
+#
+# Each worker process needs its own QUEUE_FILE: two processes flushing one
+# file would apply its entries twice, so a second process loading a file
+# that's in use fails at import. Scripts that write to the sheets (archive.py,
+# migrate.py) call config.write_queue_off() instead.
+QUEUE_FILE = get_setting("WRITE_QUEUE_FILE", "pending_writes.jsonl")
+FLUSH_DELAY = float(get_setting("WRITE_QUEUE_DELAY", 0.2))  # lets bursts of writes share one batch
+MAX_BATCH = int(get_setting("WRITE_QUEUE_BATCH", 100))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 64.0
+
+_entries = []
+_sequence = 0
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)
+_flush_lock = threading.Lock()  # held while a batch is in flight
+_holders = 0  # threads inside hold(); a batch waits for them
+_released = threading.Condition(_flush_lock)
+_wake = threading.Event()
+_flusher = None
+_applier = None
+_on_dropped = None
+_isolate = 0  # entries up to this seq are sent one at a time
+stats = {"enqueued": 0, "flushed": 0, "batches": 0, "retries": 0, "failed": 0, "skipped": 0}
+failures = deque(maxlen=50)  # recently dropped entries, newest last
+log = logging.getLogger(__name__)
+_file_lock = None
+
+
+def _lock_file():
+    global _file_lock
+    if fcntl is None:
+        return
+    _file_lock = open(QUEUE_FILE + ".lock", "a")
+    try:
+        fcntl.flock(_file_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        raise RuntimeError(
+            f"{QUEUE_FILE} is in use by another process; give this one its own WRITE_QUEUE_FILE"
+        ) from None
+
+def _load():
+    global _sequence
+    _lock_file()
+    if not os.path.exists(QUEUE_FILE):
+        return
+    with open(QUEUE_FILE) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                _entries.append(json.loads(line))
+            except ValueError:
+                break  # torn final line from a crash mid-write; it was never acknowledged
+    _sequence = max((e["seq"] for e in _entries), default=0)
+    _rewrite()  # drop any torn line before new entries are appended after it
+
+def _rewrite():
+    tmp = QUEUE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        for entry in _entries:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, QUEUE_FILE)
+
+def is_retryable(error):
+    code = getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    if not isinstance(code, int) and response is not None:
+        code = getattr(response, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    return isinstance(error, OSError)  # network failures, including requests' ConnectionError/Timeout
+
+def _backoff(attempt):
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def _complete(batch):
+    done = {e["seq"] for e in batch}
+    with _lock:
+        _entries[:] = [e for e in _entries if e["seq"] not in done]
+        _rewrite()
+        _changed.notify_all()
+
+def _next_batch():
+    with _lock:
+        if not _entries:
+            return []
+        limit = 1 if _entries[0]["seq"] <= _isolate else MAX_BATCH
+        page = _entries[0].get("page")
+        batch = []
+        for entry in _entries[:limit]:
+            if entry.get("page") != page:
+                break
+            batch.append(entry)
+        return batch
+
+def _drop(entry, error):
+    log.error("Dropping queued write %d from %s after error: %s", entry["seq"], entry.get("page"), error)
+    stats["failed"] += 1
+    failures.append({
+        "seq": entry["seq"], "page": entry.get("page"), "writes": len(entry["writes"]),
+        "error": str(error), "dropped_at": time.time(),
+    })
+    _complete([entry])
+    if _on_dropped is not None:
+        _on_dropped([tuple(w) for w in entry["writes"]])
+
+def _run():
+    global _isolate
+    attempt = 0
+    while True:
+        _wake.wait()
+        _wake.clear()
+        time.sleep(FLUSH_DELAY)
+        while True:
+            skipped, error = [], None
+            with _flush_lock:
+                _released.wait_for(lambda: not _holders)
+                batch = _next_batch()
+                if not batch:
+                    break
+                try:
+                    with attributed_to(batch[0].get("page", "background")):
+                        skipped = _applier([tuple(w) for e in batch for w in e["writes"]]) or []
+                except Exception as e:
+                    error = e
+            # Callbacks run outside _flush_lock: they may need the cache lock,
+            # which readers hold while waiting on hold().
+            if error is not None:
+                if is_retryable(error):
+                    stats["retries"] += 1
+                    time.sleep(_backoff(attempt))
+                    attempt += 1
+                elif len(batch) > 1:
+                    _isolate = batch[-1]["seq"]
+                else:
+                    _drop(batch[0], error)
+                continue
+            attempt = 0
+            stats["flushed"] += len(batch)
+            stats["batches"] += 1
+            _complete(batch)
+            if skipped:
+                log.warning("Skipped %d queued writes whose rows no longer exist: %s", len(skipped), skipped)
+                stats["skipped"] += len(skipped)
+                if _on_dropped is not None:
+                    _on_dropped(skipped)
+
+def _start():
+    global _flusher
+    if _flusher is None and _applier is not None:
+        _flusher = threading.Thread(target=_run, name="write-queue", daemon=True)
+        _flusher.start()
+
+
+def set_applier(applier, on_dropped=None):
+    # applier([(sheet, write), ...]) sends the writes and returns any it had
+    # to skip; on_dropped([(sheet, write), ...]) is told about writes that
+    # were skipped or dropped after a non-retryable error.
+    global _applier, _on_dropped
+    with _lock:
+        _applier = applier
+        _on_dropped = on_dropped
+        _start()
+        if _entries:
+            _wake.set()
+
+def enqueue(writes):
+    global _sequence
+    with _lock:
+        _sequence += 1
+        entry = {"seq": _sequence, "page": current_page(), "writes": [list(w) for w in writes]}
+        with open(QUEUE_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        _entries.append(entry)
+        stats["enqueued"] += 1
+        _start()
+    _wake.set()
+
+def pending(sheet=None):
+    with _lock:
+        if sheet is None:
+            return len(_entries)
+        return sum(1 for e in _entries if any(w[0] == sheet for w in e["writes"]))
+
+def pending_writes(sheet):
+    # Writes to `sheet` not yet applied, oldest first. Call under hold()
+    # so a batch can't land between reading the sheet and this.
+    with _lock:
+        return [w[1] for e in _entries for w in e["writes"] if w[0] == sheet]
+
+@contextmanager
+def hold():
+    # Waits for any in-flight batch and keeps the next one from starting.
+    # Any number of threads can hold at once, so concurrent sheet fetches
+    # don't queue up behind each other.
+    global _holders
+    with _flush_lock:
+        _holders += 1
+    try:
+        yield
+    finally:
+        with _flush_lock:
+            _holders -= 1
+            _released.notify_all()
+
+def flush(timeout=None):
+    # Blocks until the queue is empty; returns False on timeout.
+    _wake.set()
+    with _lock:
+        return _changed.wait_for(lambda: not _entries, timeout)
+
+
+_load()